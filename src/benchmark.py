@@ -0,0 +1,303 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+# Salts the synthetic catalog is built from, with the brand stems made from them
+SALTS = [
+    'Paracetamol', 'Amoxycillin', 'Azithromycin', 'Pantoprazole', 'Cetirizine', 'Metformin',
+    'Atorvastatin', 'Ibuprofen', 'Omeprazole', 'Diclofenac', 'Levocetirizine', 'Montelukast',
+    'Ciprofloxacin', 'Doxycycline', 'Ranitidine', 'Domperidone', 'Ondansetron', 'Telmisartan',
+    'Amlodipine', 'Losartan', 'Glimepiride', 'Rosuvastatin', 'Clopidogrel', 'Aceclofenac',
+]
+SUFFIXES = ['', 'cin', 'zole', 'mox', 'flam', 'gel', 'x', 'zo', 'fort', 'dol', 'nil', 'vin']
+STRENGTHS = ['50mg', '100mg', '250mg', '500mg', '650mg', '1000mg', '5mg', '10mg', '20mg', '40mg']
+FORMS = ['Tablet', 'Capsule', 'Syrup', 'Injection', 'Gel', 'Suspension', 'Drops', 'Cream']
+PACKS = ['strip of 10 tablets', 'strip of 15 tablets', 'bottle of 60 ml', 'vial of 2 ml', 'tube of 30 gm']
+FIRST_NAMES = ['Arnav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Rohan', 'Kavya', 'Aditya', 'Meera',
+               'Karan', 'Isha', 'Siddharth', 'Pooja', 'Nikhil', 'Riya', 'Aman', 'Neha', 'Varun', 'Tanvi']
+LAST_NAMES = ['Malhotra', 'Singh', 'Sharma', 'Patel', 'Gupta', 'Iyer', 'Reddy', 'Nair', 'Mehta', 'Kapoor',
+              'Joshi', 'Verma', 'Chopra', 'Bose', 'Das', 'Rao', 'Khan', 'Jain', 'Agarwal', 'Pillai']
+AREAS = ['Dilshad Garden Delhi 110095', 'Rajouri Garden New Delhi 110027', 'Andheri West Mumbai 400058',
+         'Koramangala Bengaluru 560034', 'Salt Lake Kolkata 700091', 'Banjara Hills Hyderabad 500034']
+
+# Share of orders in each status, as on a typical dashboard
+STATUS_WEIGHTS = {'completed': 0.7, 'pending': 0.2, 'cancelled': 0.1}
+
+# Runs of each benchmark that are not timed, so caches and connections are warm
+WARMUP = 3
+
+
+def generate_catalog(path: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    """Write a synthetic medicines CSV shaped like the real dataset"""
+    rng = np.random.default_rng(seed)
+    salt = rng.integers(len(SALTS), size=rows)
+    stems = np.array([s[:4] for s in SALTS], dtype=object)[salt]
+    names = (pd.Series(stems) + np.array(SUFFIXES, dtype=object)[rng.integers(len(SUFFIXES), size=rows)]
+             + ' ' + np.array(STRENGTHS, dtype=object)[rng.integers(len(STRENGTHS), size=rows)]
+             + ' ' + np.array(FORMS, dtype=object)[rng.integers(len(FORMS), size=rows)])
+    strength = pd.Series(np.array(STRENGTHS, dtype=object)[rng.integers(len(STRENGTHS), size=rows)])
+    second = rng.integers(len(SALTS), size=rows)
+    has_second = rng.random(rows) < 0.3
+    df = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'name': names,
+        'price(₹)': rng.uniform(5, 500, rows).round(2),
+        'Is_discontinued': np.where(rng.random(rows) < 0.05, 'TRUE', 'FALSE'),
+        'manufacturer_name': pd.Series(rng.integers(1, 200, size=rows)).map('Maker {}'.format),
+        'type': 'allopathy',
+        'pack_size_label': np.array(PACKS, dtype=object)[rng.integers(len(PACKS), size=rows)],
+        'short_composition1': pd.Series(np.array(SALTS, dtype=object)[salt]) + ' (' + strength + ')',
+        'short_composition2': np.where(has_second,
+                                       pd.Series(np.array(SALTS, dtype=object)[second]) + ' (' + strength + ')', ''),
+        'quantity': rng.integers(0, 50, size=rows),
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def generate_orders(path: str, catalog: pd.DataFrame, orders: int, seed: int = 0,
+                    customers: Optional[int] = None) -> pd.DataFrame:
+    """Write a synthetic orders.csv with 1-4 line items per order"""
+    rng = np.random.default_rng(seed + 1)
+    customers = customers or max(1, orders // 5)
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(len(FIRST_NAMES), size=customers)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(len(LAST_NAMES), size=customers)]
+    # A number keeps customer names distinct, as real users' full names mostly are
+    customer_names = pd.Series(first) + ' ' + pd.Series(last) + ' ' + pd.Series(np.arange(customers)).astype(str)
+    customer_ids = rng.integers(10 ** 9, 10 ** 10, size=customers)
+    addresses = (pd.Series(rng.integers(1, 999, size=customers)).astype(str) + ' '
+                 + pd.Series(np.array(AREAS, dtype=object)[rng.integers(len(AREAS), size=customers)]))
+
+    lines = rng.integers(1, 5, size=orders)
+    order_of_line = np.repeat(np.arange(orders), lines)
+    customer = rng.integers(customers, size=orders)
+    start = datetime(2024, 1, 1)
+    seconds = np.sort(rng.integers(0, 365 * 24 * 3600, size=orders))
+    times = pd.Series([start + timedelta(seconds=int(s)) for s in seconds])
+    statuses = rng.choice(list(STATUS_WEIGHTS), size=orders, p=list(STATUS_WEIGHTS.values()))
+    product = rng.integers(len(catalog), size=len(order_of_line))
+    quantity = rng.integers(1, 6, size=len(order_of_line))
+    price = catalog['price(₹)'].to_numpy()[product]
+
+    user_ids = customer_ids[customer]
+    order_ids = ('ORD_' + times.dt.strftime('%Y%m%d_%H%M%S') + '_' + pd.Series(user_ids).astype(str)
+                 + '_' + pd.Series(np.arange(orders)).astype(str))
+    df = pd.DataFrame({
+        'order_id': order_ids.to_numpy()[order_of_line],
+        'user_id': user_ids[order_of_line],
+        'user_name': customer_names.to_numpy()[customer][order_of_line],
+        'medicine_name': catalog['name'].to_numpy()[product],
+        'product_id': catalog['id'].to_numpy()[product],
+        'quantity': quantity,
+        'price_per_unit': price,
+        'total_price': (quantity * price).round(2),
+        'order_date': times.dt.strftime('%Y-%m-%d %H:%M:%S').to_numpy()[order_of_line],
+        'status': statuses[order_of_line],
+        'delivery_address': addresses.to_numpy()[customer][order_of_line],
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def measure(func: Callable, repeat: int, setup: Optional[Callable] = None) -> Dict:
+    """Time `repeat` calls of func, after WARMUP untimed ones; milliseconds"""
+    timings = []
+    for i in range(WARMUP + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= WARMUP:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'min_ms': round(timings[0], 4),
+    }
+
+
+def search_queries(catalog: pd.DataFrame) -> Dict[str, str]:
+    """One query per shape, taken from the generated catalog"""
+    name = catalog['name'].iloc[len(catalog) // 2]
+    return {
+        'exact': name.lower(),
+        'prefix': name.split()[0][:4].lower(),
+        'multi_term': f"{SALTS[0].lower()} {STRENGTHS[3]}",
+        'miss': 'qzxvy',
+    }
+
+
+def run_benchmarks(workdir: str, rows: int, orders: int, repeat: int, seed: int = 0) -> Dict:
+    catalog_path = os.path.join(workdir, 'medicines.csv')
+    orders_path = os.path.join(workdir, 'orders.csv')
+    db_path = os.path.join(workdir, 'benchmark.db')
+    for path in (db_path, f'{db_path}-wal', f'{db_path}-shm', f'{catalog_path}.snapshot'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    catalog = generate_catalog(catalog_path, rows, seed)
+    order_lines = generate_orders(orders_path, catalog, orders, seed)
+
+    # Imported here so the environment below is in place before the modules read it
+    os.environ['database_path'] = db_path
+    os.environ['dataset_path'] = catalog_path
+    # Set up before web_interface does, so its debug logging stays quiet
+    logging.basicConfig(level=logging.WARNING)
+    from product_db import ProductDB
+    from storage import Storage
+
+    results = {}
+    storage = Storage(db_path)
+    storage.import_orders_csv(orders_path)
+
+    # Cold start: parse, clean and index the CSV; warm start: load the snapshot
+    def cold_setup():
+        if os.path.exists(f'{catalog_path}.snapshot'):
+            os.remove(f'{catalog_path}.snapshot')
+    cold_repeat = max(1, min(repeat, 5))
+    results['cold_start'] = measure(lambda: ProductDB(catalog_path, storage=storage, compact=True),
+                                    cold_repeat, setup=cold_setup)
+    results['warm_start'] = measure(lambda: ProductDB(catalog_path, storage=storage, compact=True), cold_repeat)
+
+    product_db = ProductDB(catalog_path, storage=storage, compact=True)
+    for shape, query in search_queries(catalog).items():
+        results[f'search_products.{shape}'] = measure(
+            lambda: product_db.search_products(query, limit=10), repeat,
+            setup=product_db.query_cache.clear
+        )
+        results[f'search_products.{shape}.cached'] = measure(
+            lambda: product_db.search_products(query, limit=10), repeat
+        )
+
+    # Checkout: stock check, order insert and stock decrement in one transaction
+    in_stock = catalog[catalog['quantity'] > 0]['name'].drop_duplicates().tolist()
+    counter = iter(range(10 ** 9))
+
+    def checkout():
+        n = next(counter)
+        product = product_db.get_product_by_name(in_stock[n % len(in_stock)])
+        product_db.place_order([{
+            'order_id': f'ORD_BENCH_{n}', 'user_id': 1, 'user_name': 'Benchmark User',
+            'medicine_name': product['name'], 'product_id': product['id'], 'quantity': 1, 'price_per_unit': product['price'],
+            'total_price': product['price'], 'order_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'pending', 'delivery_address': 'Benchmark Street',
+        }])
+
+    def restock():
+        storage.conn.execute('UPDATE products SET quantity = 1000 WHERE quantity < 10')
+
+    results['checkout'] = measure(checkout, repeat, setup=restock)
+
+    import web_interface
+    # Never let a compaction rewrite the real data/orders.csv from benchmark data
+    web_interface.storage.snapshot_path = None
+    client = web_interface.app.test_client()
+    customer = order_lines['user_name'].iloc[0]
+    routes = {
+        'orders': '/orders',
+        'orders.filtered': f"/orders?date={order_lines['order_date'].iloc[-1][:10]}&name={customer.split()[0]}",
+        'orders.page_5': '/orders?pending_page=5&completed_page=5',
+        'get_customers': f'/get_customers?term={customer[:2].lower()}',
+        'get_customers.substring': f'/get_customers?term={customer.split()[1][:3].lower()}',
+    }
+    for name, url in routes.items():
+        def get(url=url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        results[f'route.{name}'] = measure(get, repeat)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'rows': rows,
+            'orders': orders,
+            'order_lines': len(order_lines),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Print median changes against a baseline run; returns the benchmarks that regressed"""
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:40} {result['median_ms']:10.3f} ms  (new)")
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:40} {result['median_ms']:10.3f} ms  {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark search, checkout and dashboard hot paths')
+    parser.add_argument('--rows', type=int, default=10000, help='Medicines in the synthetic catalog (default: 10000)')
+    parser.add_argument('--orders', type=int, default=5000, help='Orders in the synthetic history (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed runs per benchmark (default: 50)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data (default: 0)')
+    parser.add_argument('--workdir', help='Directory for the generated files (default: a temporary one)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare medians against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Slowdown over the baseline counted as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        report = run_benchmarks(args.workdir, args.rows, args.orders, args.repeat, args.seed)
+    else:
+        with tempfile.TemporaryDirectory(prefix='medisearch-bench-') as workdir:
+            report = run_benchmarks(workdir, args.rows, args.orders, args.repeat, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+    else:
+        for name, result in report['results'].items():
+            print(f"{name:40} median {result['median_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
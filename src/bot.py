@@ -1,14 +1,24 @@
 import os
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import (Application, BaseUpdateProcessor, CommandHandler, MessageHandler,
+                          CallbackQueryHandler, filters, ContextTypes)
+from telegram.request import HTTPXRequest
 from product_db import ProductDB
+from storage import Storage, OutOfStockError
 from ai_handler import AIHandler
+from session_store import SessionPersistence, SESSION_TTL
+from metrics import BOT_HANDLER_SECONDS, BOT_ERRORS, TELEGRAM_SECONDS, start_http_server
 import logging
 import sys
 import csv
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 # Set up logging - reduce verbosity
 logging.basicConfig(
@@ -32,6 +42,22 @@ def get_base_path():
 base_path = get_base_path()
 csv_path = os.path.join(base_path, 'data', os.getenv('dataset_path'))
 orders_path = os.path.join(base_path, 'data', 'orders.csv')
+db_path = os.path.join(base_path, 'data', os.getenv('database_path', 'medisearch.db'))
+# Several workers on one host can map a single copy of the catalog
+shared_catalog = os.getenv('shared_catalog', '').lower() in ('1', 'true', 'yes')
+
+# Webhook mode: Telegram posts updates to webhook_url instead of being polled.
+# The bot listens on webhook_listen:webhook_port under the URL's path.
+webhook_url = os.getenv('webhook_url')
+webhook_listen = os.getenv('webhook_listen', '0.0.0.0')
+webhook_port = int(os.getenv('webhook_port', 8443))
+webhook_secret = os.getenv('webhook_secret')
+# Bot API server to talk to, e.g. a local fake (see fake_telegram.py)
+telegram_api_url = os.getenv('telegram_api_url')
+# Port serving /metrics when the bot runs on its own; main.py serves them from the admin
+metrics_port = os.getenv('metrics_port')
+# Days a user's cart and last search are kept without activity
+session_ttl = float(os.getenv('session_ttl_days', SESSION_TTL / 86400)) * 86400
 
 def create_orders_csv():
     """Create orders.csv if it doesn't exist"""
@@ -40,7 +66,7 @@ def create_orders_csv():
         with open(orders_path, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow([
-                'order_id', 'user_id', 'user_name', 'medicine_name', 
+                'order_id', 'user_id', 'user_name', 'medicine_name', 'product_id',
                 'quantity', 'price_per_unit', 'total_price', 'order_date', 
                 'status', 'delivery_address'
             ])
@@ -49,10 +75,119 @@ def create_orders_csv():
 # Create orders.csv if needed
 create_orders_csv()
 
-# Initialize our handlers
-product_db = ProductDB(csv_path)
+# Search results shown per message
+PAGE_SIZE = 10
+
+# Blocking catalog and database calls run on this many threads, off the event loop
+BLOCKING_WORKERS = 4
+# Calls allowed to wait for or run on those threads; later callers queue for a slot
+MAX_PENDING_CALLS = 32
+# Seconds a search may queue and run before the user is asked to retry
+SEARCH_TIMEOUT = 10
+# Updates handled at once across all users; each user's run one at a time
+CONCURRENT_UPDATES = 64
+
+# Only the update types the handlers below use; Telegram drops the rest
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Seconds between sweeps that drop idle sessions from memory
+SESSION_SWEEP_INTERVAL = 3600
+
+# Connections to the Bot API shared by concurrent handlers
+API_CONNECTIONS = 256
+
+# Initialize our handlers; orders.csv is imported once, then kept as a compacted snapshot
+storage = Storage(db_path, snapshot_path=orders_path)
+storage.import_orders_csv(orders_path)
+product_db = ProductDB(csv_path, storage=storage, compact=True, shared=shared_catalog)
 ai_handler = AIHandler()
 
+blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='bot-blocking')
+_call_slots: Optional[asyncio.Semaphore] = None
+_session_sweeper: Optional[asyncio.Task] = None
+
+async def run_blocking(func, *args, timeout: Optional[float] = None, **kwargs):
+    """Run a blocking call on the worker threads so other users are not stalled.
+
+    Raises asyncio.TimeoutError if the call has not finished within `timeout`
+    seconds, including time spent waiting for a slot. A timed-out call keeps
+    its slot until it really finishes, so the pool is never oversubscribed.
+    """
+    global _call_slots
+    if _call_slots is None:
+        # Created lazily so it belongs to the running event loop
+        _call_slots = asyncio.Semaphore(MAX_PENDING_CALLS)
+    slots = _call_slots
+
+    async def call():
+        await slots.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                blocking_pool, functools.partial(func, *args, **kwargs)
+            )
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return await asyncio.shield(future)
+
+    return await asyncio.wait_for(call(), timeout)
+
+async def cart_lines(cart: List[Dict]) -> List[Tuple[Dict, int]]:
+    """(product, quantity) for each cart entry, with current name, price and stock.
+
+    Sessions keep only product ids and quantities; entries whose product has
+    left the catalog are skipped.
+    """
+    products = await run_blocking(product_db.get_products_by_ids, [item['id'] for item in cart],
+                                  timeout=SEARCH_TIMEOUT)
+    return [(products[item['id']], item['quantity']) for item in cart if item['id'] in products]
+
+class TimedRequest(HTTPXRequest):
+    """Bot API client that records each round-trip's latency by API method"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, api_method=url.rsplit('/', 1)[-1])
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Handle updates concurrently, but each user's one at a time in arrival order.
+
+    Carts and search state in user_data are only touched by one update at a
+    time, so handlers need no locking of their own.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            await coroutine
+            return
+        lock = self._locks.setdefault(user.id, asyncio.Lock())
+        self._waiting[user.id] = self._waiting.get(user.id, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            self._waiting[user.id] -= 1
+            if not self._waiting[user.id]:
+                del self._waiting[user.id]
+                del self._locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+@BOT_HANDLER_SECONDS.time(handler='start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     await update.message.reply_text(
@@ -70,6 +205,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'Use /help for more details.'
     )
 
+@BOT_HANDLER_SECONDS.time(handler='help')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /help is issued."""
     await update.message.reply_text(
@@ -98,6 +234,41 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         '❓ Need more help? Contact @support'
     )
 
+def search_results_text(query: str, page: dict) -> str:
+    """Header for a page of search results"""
+    first = page['offset'] + 1
+    last = page['offset'] + len(page['items'])
+    return (
+        f"Found {page['total']} medicines matching '{query}'.\n"
+        f"Showing results {first}-{last}. Click for details:"
+    )
+
+def search_results_markup(page: dict) -> InlineKeyboardMarkup:
+    """Medicine buttons for a page of search results plus Prev/Next navigation"""
+    keyboard = []
+    for idx, product in enumerate(page['items']):
+        # Use shorter callback data
+        callback_data = f"med_{idx}"  # Much shorter than JSON
+        keyboard.append([InlineKeyboardButton(
+            text=f"{product['name'][:30]} - ₹{product['price']:.2f} (Stock: {product['quantity']})",
+            callback_data=callback_data
+        )])
+
+    navigation = []
+    if page['offset'] > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f"page_{max(0, page['offset'] - page['limit'])}"
+        ))
+    if page['offset'] + len(page['items']) < page['total']:
+        navigation.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=f"page_{page['offset'] + page['limit']}"
+        ))
+    if navigation:
+        keyboard.append(navigation)
+
+    return InlineKeyboardMarkup(keyboard)
+
+@BOT_HANDLER_SECONDS.time(handler='search')
 async def search_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Search medicines based on user message."""
     query = update.message.text.lower()
@@ -105,44 +276,55 @@ async def search_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Handle address input if we're waiting for it
     if context.user_data.get('awaiting_address'):
         address = update.message.text
-        cart = context.user_data.get('cart', [])
+        try:
+            lines = await cart_lines(context.user_data.get('cart', []))
+        except asyncio.TimeoutError:
+            await update.message.reply_text(
+                "That is taking longer than usual. Please send your address again in a moment."
+            )
+            return
+        if not lines:
+            context.user_data['awaiting_address'] = False
+            await update.message.reply_text("Your cart is empty!")
+            return
         
         # Generate order ID
         order_id = f"ORD_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{update.message.from_user.id}"
         
-        # Save order with address
-        orders_df = pd.read_csv(orders_path)
-        
         new_orders = []
-        for item in cart:
+        for product, quantity in lines:
             new_orders.append({
                 'order_id': order_id,
                 'user_id': update.message.from_user.id,
                 'user_name': update.message.from_user.full_name,
-                'medicine_name': item['name'],
-                'quantity': item['quantity'],
-                'price_per_unit': item['price'],
-                'total_price': item['quantity'] * item['price'],
+                'medicine_name': product['name'],
+                'product_id': product['id'],
+                'quantity': quantity,
+                'price_per_unit': product['price'],
+                'total_price': quantity * product['price'],
                 'order_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'status': 'pending',
                 'delivery_address': address
             })
-            
-            # Update stock
-            product_db.df.loc[product_db.df['name'] == item['name'], 'quantity'] -= item['quantity']
         
-        # Update CSVs
-        new_orders_df = pd.DataFrame(new_orders)
-        updated_orders = pd.concat([orders_df, new_orders_df], ignore_index=True)
-        updated_orders.to_csv(orders_path, index=False)
-        product_db.df.to_csv(csv_path, index=False)
+        # Re-check stock, take the lines out of it and save the order atomically.
+        # No timeout: giving up while the order may still be saved invites a double order
+        try:
+            await run_blocking(product_db.place_order, new_orders)
+        except OutOfStockError as e:
+            context.user_data['awaiting_address'] = False
+            await update.message.reply_text(
+                f"Sorry, only {e.available} units of {e.name} are left in stock.\n"
+                "Please update your cart with /cart and place the order again."
+            )
+            return
         
         # Clear cart and address flag
         context.user_data['cart'] = []
         context.user_data['awaiting_address'] = False
         
         # Send confirmation
-        total = sum(item['quantity'] * item['price'] for item in cart)
+        total = sum(order['total_price'] for order in new_orders)
         await update.message.reply_text(
             f"✅ Order placed successfully!\n\n"
             f"Order ID: {order_id}\n"
@@ -157,13 +339,12 @@ async def search_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Received query: {query}")
     
     try:
-        # Search for medicines
-        products = product_db.search_products(query)
-        # Filter out products with zero quantity
-        products = [p for p in products if p['quantity'] > 0]
-        logger.info(f"Found {len(products)} medicines")
+        # Search for medicines; only in-stock ones, one page at a time
+        page = await run_blocking(product_db.search_page, query, offset=0, limit=PAGE_SIZE,
+                                  timeout=SEARCH_TIMEOUT)
+        logger.info(f"Found {page['total']} medicines")
         
-        if not products:
+        if not page['total']:
             await update.message.reply_text(
                 "I couldn't find any medicines matching your query.\n"
                 "Try searching by:\n"
@@ -173,43 +354,33 @@ async def search_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        # Store search results in user_data
-        if not context.user_data:
-            context.user_data.clear()
-        context.user_data['last_search'] = products[:10]
-
-        # Create inline keyboard with medicine buttons
-        keyboard = []
-        for idx, product in enumerate(products[:10]):
-            # Use shorter callback data
-            callback_data = f"med_{idx}"  # Much shorter than JSON
-            keyboard.append([InlineKeyboardButton(
-                text=f"{product['name'][:30]} - ₹{product['price']:.2f} (Stock: {product['quantity']})",
-                callback_data=callback_data
-            )])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        total_found = len(products)
-        shown = min(10, total_found)
-        
-        message = (
-            f"Found {total_found} medicines matching '{query}'.\n"
-            f"Showing first {shown} results. Click for details:"
-        )
+        # Remember the search by product ids; details are looked up again when clicked
+        context.user_data['last_search'] = {
+            'query': query,
+            'offset': page['offset'],
+            'ids': [product['id'] for product in page['items']]
+        }
         
         await update.message.reply_text(
-            message,
-            reply_markup=reply_markup
+            search_results_text(query, page),
+            reply_markup=search_results_markup(page)
         )
 
+    except asyncio.TimeoutError:
+        logger.warning(f"Search timed out: {query}")
+        BOT_ERRORS.inc(handler='search')
+        await update.message.reply_text(
+            "The search is taking longer than usual. Please try again in a moment."
+        )
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
+        BOT_ERRORS.inc(handler='search')
         await update.message.reply_text(
             "Sorry, I encountered an error processing your request.\n"
             "Please try again or contact support."
         )
 
+@BOT_HANDLER_SECONDS.time(handler='button')
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button clicks for medicine details."""
     query = update.callback_query
@@ -225,12 +396,34 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        if query.data.startswith("med_"):
+        if query.data.startswith("page_"):
+            # Show another page of the last search
+            if 'last_search' not in context.user_data:
+                await query.message.reply_text("Please search for the medicine again.")
+                return
+            last_search = context.user_data['last_search']
+            offset = int(query.data.split("_")[1])
+            page = await run_blocking(product_db.search_page, last_search['query'], offset=offset,
+                                      limit=PAGE_SIZE, timeout=SEARCH_TIMEOUT)
+            if not page['items']:
+                await query.message.reply_text("No more results. Please search again.")
+                return
+            last_search['offset'] = page['offset']
+            last_search['ids'] = [product['id'] for product in page['items']]
+            await query.edit_message_text(
+                search_results_text(last_search['query'], page),
+                reply_markup=search_results_markup(page)
+            )
+        
+        elif query.data.startswith("med_"):
             idx = int(query.data.split("_")[1])
             if 'last_search' in context.user_data:
-                products = context.user_data['last_search']
-                if 0 <= idx < len(products):
-                    product = products[idx]
+                ids = context.user_data['last_search']['ids']
+                product = None
+                if 0 <= idx < len(ids):
+                    product = await run_blocking(product_db.get_product_by_id, ids[idx],
+                                                 timeout=SEARCH_TIMEOUT)
+                if product:
                     detail_text = (
                         f"💊 Medicine Details:\n\n"
                         f"Name: {product['name']}\n"
@@ -273,7 +466,13 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.message.reply_text("Please search for the medicine again.")
                 return
                 
-            product = context.user_data['last_search'][idx]
+            ids = context.user_data['last_search']['ids']
+            product = None
+            if 0 <= idx < len(ids):
+                product = await run_blocking(product_db.get_product_by_id, ids[idx], timeout=SEARCH_TIMEOUT)
+            if not product:
+                await query.message.reply_text("Sorry, I couldn't find the medicine details.")
+                return
             
             # Check if quantity is available
             if qty > product['quantity']:
@@ -288,7 +487,7 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             # Check if item already in cart
             existing_item = next(
-                (item for item in context.user_data['cart'] if item['name'] == product['name']), 
+                (item for item in context.user_data['cart'] if item.get('id') == product['id']), 
                 None
             )
             
@@ -304,10 +503,9 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 existing_item['quantity'] = new_qty
                 msg = f"Updated quantity to {new_qty}x {product['name']} in cart!"
             else:
-                # Add new item to cart
+                # Add new item to cart; name and price are looked up when shown or ordered
                 cart_item = {
-                    'name': product['name'],
-                    'price': product['price'],
+                    'id': product['id'],
                     'quantity': qty
                 }
                 context.user_data['cart'].append(cart_item)
@@ -332,8 +530,13 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif query.data == "place_order":
             await process_order(update, context)
         
+    except asyncio.TimeoutError:
+        logger.warning(f"Button action timed out: {query.data}")
+        BOT_ERRORS.inc(handler='button')
+        await query.message.reply_text("That is taking longer than usual. Please try again in a moment.")
     except Exception as e:
         logger.error(f"Error handling button click: {str(e)}")
+        BOT_ERRORS.inc(handler='button')
         await query.message.reply_text("Sorry, there was an error processing your request.")
 
 async def show_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -342,13 +545,22 @@ async def show_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text("Your cart is empty!")
         return
         
-    cart = context.user_data['cart']
-    total = sum(item['price'] * item['quantity'] for item in cart)
+    try:
+        lines = await cart_lines(context.user_data['cart'])
+    except asyncio.TimeoutError:
+        logger.warning("Loading the cart timed out")
+        BOT_ERRORS.inc(handler='cart')
+        await update.effective_message.reply_text("That is taking longer than usual. Please try again in a moment.")
+        return
+    if not lines:
+        await update.effective_message.reply_text("Your cart is empty!")
+        return
+    total = sum(product['price'] * quantity for product, quantity in lines)
     
     cart_text = "🛒 Your Cart:\n\n"
-    for item in cart:
-        cart_text += f"• {item['quantity']}x {item['name']}\n"
-        cart_text += f"  Subtotal: ₹{item['price'] * item['quantity']:.2f}\n"
+    for product, quantity in lines:
+        cart_text += f"• {quantity}x {product['name']}\n"
+        cart_text += f"  Subtotal: ₹{product['price'] * quantity:.2f}\n"
     
     cart_text += f"\nTotal: ₹{total:.2f}"
     
@@ -382,10 +594,27 @@ async def process_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     context.user_data['awaiting_address'] = True
 
+@BOT_HANDLER_SECONDS.time(handler='cart')
 async def cart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /cart command"""
     await show_cart(update, context)
 
+async def sweep_idle_sessions(application: Application):
+    """Drop sessions idle past their TTL from memory; the store deletes them on its next write"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        for user_id in application.persistence.idle_users():
+            application.drop_user_data(user_id)
+
+async def start_background_work(application: Application):
+    global _session_sweeper
+    _session_sweeper = asyncio.get_running_loop().create_task(sweep_idle_sessions(application))
+
+async def shutdown_background_work(application: Application):
+    if _session_sweeper is not None:
+        _session_sweeper.cancel()
+    blocking_pool.shutdown(wait=False)
+
 def main():
     """Start the bot."""
     token = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -393,7 +622,17 @@ def main():
         logger.error("No TELEGRAM_BOT_TOKEN found!")  # Simplified error
         return
         
-    application = Application.builder().token(token).build()
+    builder = (Application.builder()
+               .token(token)
+               .request(TimedRequest(connection_pool_size=API_CONNECTIONS))
+               .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+               .persistence(SessionPersistence(storage, ttl=session_ttl))
+               .post_init(start_background_work)
+               .post_shutdown(shutdown_background_work))
+    if telegram_api_url:
+        api_url = telegram_api_url.rstrip('/')
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+    application = builder.build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -402,8 +641,22 @@ def main():
     application.add_handler(CallbackQueryHandler(button_click))
     application.add_handler(CommandHandler("cart", cart_command))
 
-    logger.warning("Bot started!")  # Changed to warning level
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if metrics_port:
+        start_http_server(int(metrics_port))
+
+    if webhook_url:
+        logger.warning(f"Bot started with webhook {webhook_url}")
+        application.run_webhook(
+            listen=webhook_listen,
+            port=webhook_port,
+            url_path=urlparse(webhook_url).path.lstrip('/'),
+            webhook_url=webhook_url,
+            secret_token=webhook_secret,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        logger.warning("Bot started!")  # Changed to warning level
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from storage import Storage
+
+# Queries whose results are kept; cleared whenever new customers arrive
+CUSTOMER_CACHE_SIZE = 512
+
+
+def bigrams(text: str) -> List[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+class CustomerIndex:
+    """In-memory index of customer names for autocomplete.
+
+    Names come from the database's customers table and are picked up
+    incrementally as orders arrive. A sorted array of lowercase names
+    answers prefix queries; a bigram index over the same names finds
+    substring matches without scanning every customer.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._names: List[str] = []
+        self._keys: List[str] = []
+        self._sorted: List[Tuple[str, int]] = []
+        self._grams: Dict[str, List[int]] = {}
+        self._last_rowid = 0
+        self._cache = OrderedDict()
+
+    def refresh(self):
+        """Add customers stored since the last refresh"""
+        if self.storage.last_customer_rowid() == self._last_rowid:
+            return
+        with self._lock:
+            # Another thread may have caught up while we waited for the lock
+            last = self.storage.last_customer_rowid()
+            if last < self._last_rowid:
+                # The table was rebuilt; row ids no longer line up
+                self._reset()
+            for rowid, name in self.storage.customers_since(self._last_rowid):
+                self._add(name)
+                self._last_rowid = rowid
+            # Already sorted apart from the new tail, which timsort merges in linear time
+            self._sorted.sort()
+            self._cache.clear()
+
+    def _add(self, name: str):
+        customer_id = len(self._names)
+        key = name.lower()
+        self._names.append(name)
+        self._keys.append(key)
+        self._sorted.append((key, customer_id))
+        # Ids are appended in order, so every posting list stays sorted
+        for gram in set(bigrams(key)):
+            self._grams.setdefault(gram, []).append(customer_id)
+
+    def search(self, term: str, limit: int = 10) -> List[str]:
+        """Up to `limit` names containing `term`, names starting with it first"""
+        self.refresh()
+        term = term.strip().lower()
+        with self._lock:
+            key = (term, limit)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            result = [self._names[i] for i in self._match(term, limit)]
+            self._cache[key] = result
+            if len(self._cache) > CUSTOMER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return result
+
+    def _match(self, term: str, limit: int) -> List[int]:
+        found = []
+        pos = bisect_left(self._sorted, (term, -1))
+        while pos < len(self._sorted) and len(found) < limit:
+            key, customer_id = self._sorted[pos]
+            if not key.startswith(term):
+                break
+            found.append(customer_id)
+            pos += 1
+        if len(found) >= limit or not term:
+            return found
+
+        seen = set(found)
+        if len(term) < 2:
+            candidates = range(len(self._keys))
+        else:
+            postings = [self._grams.get(gram, []) for gram in set(bigrams(term))]
+            # Every substring match is in the shortest list; check just those
+            candidates = min(postings, key=len)
+        for customer_id in candidates:
+            if customer_id not in seen and term in self._keys[customer_id]:
+                found.append(customer_id)
+                if len(found) >= limit:
+                    break
+        return found
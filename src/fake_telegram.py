@@ -0,0 +1,155 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for the Telegram Bot API, for trying the bot's webhook mode locally.
+# Start it, point the bot at it with telegram_api_url=http://127.0.0.1:8081 and
+# webhook_url=http://127.0.0.1:8443/telegram, and it replays test messages to
+# the webhook the bot registers, printing every API call the bot makes.
+
+# Attempts, half a second apart, to reach a webhook that is not up yet
+WEBHOOK_RETRIES = 10
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'MediSearch', 'username': 'medisearch_test_bot'}
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.webhook_url = None
+        self.secret_token = None
+        self.webhook_set = threading.Event()
+        self._message_id = 0
+        self._update_id = 0
+        self._lock = threading.Lock()
+
+    def _next_message_id(self) -> int:
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def _message(self, params: dict) -> dict:
+        chat_id = int(params.get('chat_id', 0))
+        return {
+            'message_id': int(params.get('message_id') or self._next_message_id()),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    def handle(self, method: str, params: dict):
+        """Result of one Bot API call"""
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.secret_token = params.get('secret_token')
+            self.webhook_set.set()
+            return True
+        if method in ('deleteWebhook', 'answerCallbackQuery', 'close', 'logOut'):
+            return True
+        if method == 'getUpdates':
+            time.sleep(1)
+            return []
+        if method in ('sendMessage', 'editMessageText'):
+            print(f"{method} to {params.get('chat_id')}: {params.get('text', '')[:80]!r}")
+            return self._message(params)
+        return True
+
+    def send_message(self, user_id: int, text: str) -> int:
+        """Deliver a user's text message to the registered webhook; returns the HTTP status"""
+        with self._lock:
+            self._update_id += 1
+            update_id = self._update_id
+        update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': self._next_message_id(),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'},
+                'text': text,
+            },
+        }
+        request = urllib.request.Request(
+            self.webhook_url, data=json.dumps(update).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json'}
+        )
+        if self.secret_token:
+            request.add_header('X-Telegram-Bot-Api-Secret-Token', self.secret_token)
+        # The bot registers its webhook just before its server starts listening
+        for attempt in range(WEBHOOK_RETRIES):
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    return response.status
+            except urllib.error.URLError as e:
+                if attempt == WEBHOOK_RETRIES - 1 or not isinstance(e.reason, ConnectionRefusedError):
+                    print(f"Could not deliver {text!r} from {user_id}: {e.reason}")
+                    return 0
+                time.sleep(0.5)
+
+
+def make_handler(fake: FakeTelegram):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params = json.loads(body or b'{}')
+            else:
+                params = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+            # Paths look like /bot<token>/<method>
+            method = urlparse(self.path).path.rsplit('/', 1)[-1]
+            payload = json.dumps({'ok': True, 'result': fake.handle(method, params)}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Telegram Bot API')
+    parser.add_argument('--port', type=int, default=8081, help='Port to serve the API on (default: 8081)')
+    parser.add_argument('--message', action='append', default=[],
+                        help='Text to send to the bot once its webhook is set; repeatable')
+    parser.add_argument('--users', type=int, default=1, help='Users sending each message at once (default: 1)')
+    args = parser.parse_args()
+
+    fake = FakeTelegram()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Fake Bot API on http://127.0.0.1:{args.port}; waiting for the bot to set its webhook")
+
+    try:
+        if args.message:
+            fake.webhook_set.wait()
+            print(f"Webhook set to {fake.webhook_url}")
+            for text in args.message:
+                start = time.time()
+                threads = [threading.Thread(target=fake.send_message, args=(1000 + user, text))
+                           for user in range(args.users)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                print(f"Delivered {text!r} from {args.users} users in {time.time() - start:.2f}s")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
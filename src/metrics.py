@@ -0,0 +1,279 @@
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond lookups to multi-second reloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Fraction of timed calls that are recorded; lower it to shave the last bit of overhead
+SAMPLE_RATE = float(os.getenv('metrics_sample_rate', 1.0))
+
+# Fraction of timed calls also run under cProfile, for /metrics/profile; off by default
+PROFILE_RATE = float(os.getenv('profile_sample_rate', 0.0))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    """Monotonic count per label set"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram(Metric):
+    """Cumulative buckets, sum and count per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Counts per bucket, not cumulative; the last slot is +Inf
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def time(self, **labels) -> 'Timer':
+        return Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Profiler:
+    """cProfile statistics merged from the sampled calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Optional[pstats.Stats] = None
+        self.samples = 0
+
+    def should_sample(self) -> bool:
+        # cProfile can only watch one call at a time per thread
+        return PROFILE_RATE > 0 and not getattr(self._local, 'active', False) and random.random() < PROFILE_RATE
+
+    def start(self) -> cProfile.Profile:
+        self._local.active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: cProfile.Profile):
+        profile.disable()
+        self._local.active = False
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.samples += 1
+
+    def report(self, limit: int = 40) -> str:
+        """Functions with the most cumulative time across the samples"""
+        with self._lock:
+            if self._stats is None:
+                return 'No profiles sampled; set profile_sample_rate to enable.\n'
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats('cumulative').print_stats(limit)
+        return f'{self.samples} sampled calls\n' + out.getvalue()
+
+
+PROFILER = Profiler()
+
+
+class Timer:
+    """Time a block or function into a histogram: `with HIST.time(stage='x'):` or as a decorator.
+
+    Decorated coroutine functions are timed until they finish.
+    """
+
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+        self._local = threading.local()
+
+    def __enter__(self):
+        sampled = SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+        profile = PROFILER.start() if sampled and PROFILER.should_sample() else None
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append((sampled, profile, time.perf_counter()))
+        return self
+
+    def __exit__(self, *exc):
+        sampled, profile, start = self._local.stack.pop()
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            PROFILER.stop(profile)
+        if sampled:
+            self.histogram.observe(elapsed, **self.labels)
+        return False
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_coroutine(*args, **kwargs):
+                # Coroutines interleave on one thread, so time each call on its own
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    if SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE:
+                        self.histogram.observe(time.perf_counter() - start, **self.labels)
+            return timed_coroutine
+
+        @functools.wraps(func)
+        def timed_function(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return timed_function
+
+
+def start_http_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics and /metrics/profile from a background thread, for processes without Flask"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics/profile'):
+                body, content_type = PROFILER.report(), 'text/plain; charset=utf-8'
+            elif self.path.startswith('/metrics'):
+                body, content_type = REGISTRY.render(), CONTENT_TYPE
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
+
+
+# Stages instrumented across the bot and the admin
+CATALOG_LOAD_SECONDS = Histogram(
+    'medisearch_catalog_load_seconds', 'Full catalog loads and incremental reloads', ['source'])
+SEARCH_SECONDS = Histogram(
+    'medisearch_search_seconds', 'ProductDB search calls, including materializing results', ['call'])
+MATCH_SECONDS = Histogram(
+    'medisearch_search_match_seconds', 'Ranking a query, by the matching tier that answered it', ['tier'])
+MATERIALIZE_SECONDS = Histogram(
+    'medisearch_materialize_seconds', 'Turning matched rows into product dicts')
+SEARCH_CACHE = Counter(
+    'medisearch_search_cache_total', 'Search cache lookups by result', ['result'])
+CHECKOUT_SECONDS = Histogram(
+    'medisearch_checkout_write_seconds', 'Checkout transaction: stock check, order insert and stock decrement')
+COMPACTION_SECONDS = Histogram(
+    'medisearch_compaction_seconds', 'Order compaction including the orders.csv snapshot rewrite')
+HTTP_SECONDS = Histogram(
+    'medisearch_http_request_seconds', 'Admin web requests', ['endpoint', 'method', 'status'])
+BOT_HANDLER_SECONDS = Histogram(
+    'medisearch_bot_handler_seconds', 'Bot update handlers, from dispatch to reply', ['handler'])
+BOT_ERRORS = Counter(
+    'medisearch_bot_errors_total', 'Bot handler errors shown to users', ['handler'])
+TELEGRAM_SECONDS = Histogram(
+    'medisearch_telegram_request_seconds', 'Bot API round-trips', ['api_method'])
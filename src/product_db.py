@@ -1,147 +1,753 @@
-import pandas as pd
-from typing import List, Dict, Optional
-import os
-
-class ProductDB:
-    def __init__(self, csv_path: str):
-        self.csv_path = csv_path  # Store path for later use
-        
-        # Create empty DataFrame if file doesn't exist
-        if not os.path.exists(csv_path):
-            self.df = pd.DataFrame(columns=[
-                'name', 'price(₹)', 'manufacturer_name', 'type', 
-                'pack_size_label', 'short_composition1', 'short_composition2',
-                'quantity', 'Is_discontinued'
-            ])
-            return
-            
-        # Load initial data
-        self._load_data()
-    
-    def _load_data(self):
-        """Load and clean data from CSV"""
-        # Read without dtypes to see what we have
-        self.df = pd.read_csv(self.csv_path, low_memory=False)
-        
-        # Clean price column first - remove any currency symbols and convert to float
-        self.df['price(₹)'] = (self.df['price(₹)']
-                              .astype(str)
-                              .str.replace('₹', '', regex=False)
-                              .str.replace('Rs.', '', regex=False)
-                              .str.strip())
-        self.df['price(₹)'] = pd.to_numeric(self.df['price(₹)'], errors='coerce')
-        
-        # Convert medicine names to lowercase and store original names
-        self.df['name_lower'] = self.df['name'].str.lower()  # Add lowercase column for searching
-        
-        # Clean text columns
-        text_columns = ['manufacturer_name', 'type', 'pack_size_label', 'short_composition1', 'short_composition2']
-        for col in text_columns:
-            if col in self.df.columns:
-                self.df[col] = self.df[col].astype(str).str.strip()
-        
-        # Convert boolean column
-        if 'Is_discontinued' in self.df.columns:
-            self.df['Is_discontinued'] = self.df['Is_discontinued'].astype(bool)
-        
-        # Add quantity column if it doesn't exist
-        if 'quantity' not in self.df.columns:
-            self.df['quantity'] = 100  # Default quantity for existing products
-        else:
-            self.df['quantity'] = pd.to_numeric(self.df['quantity'], errors='coerce').fillna(0).astype(int)
-        
-        # Clean up any NaN values
-        self.df = self.df.fillna('')
-    
-    def search_products(self, query: str) -> List[Dict]:
-        """Search products with a more flexible matching algorithm."""
-        try:
-            # Reload data to get latest changes
-            self._load_data()
-            
-            # Convert query to lowercase and split into terms
-            search_terms = query.lower().split()
-            
-            # First try exact match using lowercase name
-            exact_matches = self.df[
-                self.df['name_lower'] == query.lower()
-            ].copy()
-            
-            if not exact_matches.empty:
-                matches = exact_matches
-            else:
-                # Try matching products that start with the first search term
-                starts_with_matches = self.df[
-                    self.df['name_lower'].str.startswith(search_terms[0])
-                ].copy()
-                
-                if not starts_with_matches.empty:
-                    matches = starts_with_matches
-                else:
-                    # Try matching all terms in sequence
-                    matches = self.df[
-                        self.df['name_lower'].apply(
-                            lambda x: all(
-                                term in x[i:] 
-                                for i, term in enumerate(search_terms)
-                            )
-                        )
-                    ].copy()
-                    
-                    # If still no matches, fall back to the original flexible matching
-                    if matches.empty:
-                        matches = self.df[
-                            self.df['name_lower'].apply(
-                                lambda x: all(term in x for term in search_terms)
-                            )
-                        ].copy()
-            
-            # Convert matches to list of dictionaries
-            results = []
-            for _, row in matches.iterrows():
-                composition = row['short_composition1']
-                if pd.notna(row['short_composition2']):
-                    composition += f", {row['short_composition2']}"
-                
-                results.append({
-                    'name': row['name'],
-                    'price': float(row['price(₹)']),
-                    'quantity': int(row['quantity']),
-                    'manufacturer': row['manufacturer_name'],
-                    'category': row['type'],
-                    'package_size': row['pack_size_label'],
-                    'salt': composition
-                })
-            
-            return results
-
-        except Exception as e:
-            print(f"Error in search_products: {str(e)}")
-            return []
-
-    def get_product_by_name(self, name: str) -> Optional[Dict]:
-        """Get medicine details by name"""
-        try:
-            # Reload data to get latest changes
-            self._load_data()
-            
-            matches = self.df[self.df['name_lower'] == name.lower()]
-            if not matches.empty:
-                row = matches.iloc[0]
-                composition = row['short_composition1']
-                if pd.notna(row['short_composition2']):
-                    composition += f", {row['short_composition2']}"
-
-                return {
-                    'name': row['name'],
-                    'price': float(row['price(₹)']),
-                    'quantity': int(row['quantity']),
-                    'manufacturer': row['manufacturer_name'],
-                    'category': row['type'],
-                    'package_size': row['pack_size_label'],
-                    'salt': composition
-                }
-            return None
-        except Exception as e:
-            print(f"Error in get_product_by_name: {str(e)}")
-            return None 
\ No newline at end of file
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from typing import List, Dict, Iterator, Optional, NamedTuple, Tuple
+import hashlib
+import io
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from storage import Storage, OutOfStockError
+from search_index import SearchIndex, IndexBuilder, tokenize, EMPTY_ROWS, EMPTY_SCORES
+from shared_catalog import SharedCatalog
+from query_cache import QueryCache
+from metrics import (CATALOG_LOAD_SECONDS, SEARCH_SECONDS, MATCH_SECONDS, MATERIALIZE_SECONDS,
+                     SEARCH_CACHE)
+
+# Columns added by _clean_data that are not part of the source CSV
+DERIVED_COLUMNS = ['salt']
+
+# Source columns ProductDB uses; compact mode does not load any others
+CATALOG_COLUMNS = [
+    'id', 'name', 'price(₹)', 'Is_discontinued', 'manufacturer_name', 'type',
+    'pack_size_label', 'short_composition1', 'short_composition2', 'quantity'
+]
+
+# Text columns with few distinct values, stored as categoricals in compact mode
+CATEGORY_COLUMNS = [
+    'manufacturer_name', 'type', 'pack_size_label',
+    'short_composition1', 'short_composition2', 'salt'
+]
+
+# Product dict key -> catalog column, in the order results are built
+RESULT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'price': 'price(₹)',
+    'quantity': 'quantity',
+    'manufacturer': 'manufacturer_name',
+    'category': 'type',
+    'package_size': 'pack_size_label',
+    'salt': 'salt',
+}
+
+# Text columns, read as strings rather than letting pandas guess from the data
+TEXT_COLUMNS = ['manufacturer_name', 'type', 'pack_size_label', 'short_composition1', 'short_composition2']
+
+# Explicit dtypes for the catalog columns. Price, id, quantity and the
+# discontinued flag arrive in mixed formats and are parsed by _clean_data
+CSV_DTYPES = {col: str for col in ['name', 'price(₹)', 'Is_discontinued', 'id', 'quantity'] + TEXT_COLUMNS}
+
+# Catalog rows parsed and cleaned at a time; bounds the memory a load needs beyond the result
+CSV_CHUNK_ROWS = 100000
+
+# Spellings of a true discontinued flag
+TRUE_VALUES = ['true', 't', 'yes', 'y', '1', '1.0']
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Queries whose ranked rows are kept, and for how many seconds
+RANKED_CACHE_SIZE = 256
+RANKED_CACHE_TTL = 600
+
+# Bump when the snapshot payload or anything pickled in it changes shape
+SNAPSHOT_FORMAT = 3
+
+
+class FileFingerprint(NamedTuple):
+    """Identity of the catalog file as of the last (re)load"""
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+class RankedRows:
+    """Rows matching one query, best first, and which of them are in stock"""
+
+    __slots__ = ('rows', 'scores', 'in_stock')
+
+    def __init__(self, rows: np.ndarray, scores: np.ndarray, quantities: np.ndarray):
+        self.rows = rows
+        self.scores = scores
+        self.in_stock = quantities[rows] > 0
+
+    def restock(self, quantities: np.ndarray, changed: Optional[np.ndarray] = None):
+        """Refresh the in-stock flags, only for the `changed` row positions if given"""
+        if changed is None:
+            self.in_stock = quantities[self.rows] > 0
+            return
+        hit = np.isin(self.rows, changed)
+        if hit.any():
+            self.in_stock[hit] = quantities[self.rows[hit]] > 0
+
+
+def _hash_file(path: str, length: Optional[int] = None) -> str:
+    """Hash the first `length` bytes of a file (the whole file by default)"""
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            size = HASH_BLOCK_SIZE if remaining is None else min(HASH_BLOCK_SIZE, remaining)
+            block = f.read(size)
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Stack cleaned catalog chunks; categorical columns are merged rather than decoded to text"""
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [chunk[col] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(union_categoricals(parts, sort_categories=True))
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+class ProductDB:
+    def __init__(self, csv_path: str, storage: Optional[Storage] = None, compact: bool = False,
+                 snapshot: bool = True, shared: bool = False):
+        self.csv_path = csv_path  # Store path for later use
+        # Stock levels live in the shared database when one is given
+        self.storage = storage
+        # Trade a little load time for a much smaller catalog in memory
+        self.compact = compact
+        # Cleaned catalog and indexes are cached next to the CSV for fast startup
+        self.snapshot_path = f"{csv_path}.snapshot" if snapshot else None
+        # Workers started with shared=True map one read-only catalog file
+        # instead of each holding a copy; only stock levels are per process
+        self.shared_path = f"{csv_path}.shared" if shared else None
+        self.catalog: Optional[SharedCatalog] = None
+        self._stock: Optional[np.ndarray] = None
+        self._stock_version = None
+        self._fingerprint: Optional[FileFingerprint] = None
+        self._stale = False
+        # Bumped whenever the rows move, so cached row positions expire
+        self._version = 0
+        # Ranked matches per (normalized query, version); stock changes patch them in place
+        self.query_cache = QueryCache(RANKED_CACHE_SIZE, RANKED_CACHE_TTL)
+        # Serializes reloads, stock changes and searches between threads
+        self._lock = threading.RLock()
+        # Point lookups: normalized name -> row positions, product id -> row position
+        self._rows_by_name: Dict[str, List[int]] = {}
+        self._row_by_id: Dict[int, int] = {}
+        
+        # Create empty DataFrame if file doesn't exist
+        if not os.path.exists(csv_path):
+            self.df = self._empty_frame()
+            self.index = SearchIndex.build(self.df)
+            return
+            
+        # Load initial data
+        self._load_data()
+
+    @staticmethod
+    def _empty_frame() -> pd.DataFrame:
+        return pd.DataFrame(columns=[
+            'name', 'price(₹)', 'manufacturer_name', 'type', 
+            'pack_size_label', 'short_composition1', 'short_composition2',
+            'quantity', 'Is_discontinued'
+        ] + DERIVED_COLUMNS)
+    
+    @CATALOG_LOAD_SECONDS.time(source='full')
+    def _load_data(self):
+        """Load and clean data from CSV, or from its snapshot if that is current"""
+        # Fingerprint before reading so a write racing the read is seen next time
+        fingerprint = self._current_fingerprint()
+        if self.shared_path:
+            self._load_shared(fingerprint)
+        elif not self._load_snapshot(fingerprint):
+            self._build_catalog()
+            self._write_snapshot(fingerprint)
+        self.query_cache.clear()
+        self._sync_stock()
+        self._version += 1
+        self._fingerprint = fingerprint
+        self._stale = False
+
+    def _build_catalog(self):
+        """Stream the CSV into a private frame, indexing each chunk as it is cleaned"""
+        builder = IndexBuilder()
+        chunks = []
+        for chunk in self._read_chunks(self.csv_path):
+            builder.add(chunk)
+            chunks.append(chunk)
+        self.df = _concat_chunks(chunks) if chunks else self._clean_data(self._empty_frame())
+        del chunks
+        self.index = builder.finish()
+        self._rows_by_name, self._row_by_id = {}, {}
+        self._index_rows(0)
+
+    def _load_shared(self, fingerprint: FileFingerprint):
+        """Map the shared catalog file, (re)writing it first if it is not current.
+
+        Falls back to a private in-memory catalog if the file cannot be written.
+        """
+        try:
+            catalog = SharedCatalog.open(self.shared_path)
+        except Exception as e:
+            print(f"Ignoring unreadable shared catalog: {str(e)}")
+            catalog = None
+        if catalog is None or catalog.digest != fingerprint.digest:
+            self._build_catalog()
+            try:
+                SharedCatalog.write(self.shared_path, self.df, self.index, fingerprint.digest)
+                catalog = SharedCatalog.open(self.shared_path)
+            except OSError as e:
+                print(f"Could not write shared catalog, keeping a private copy: {str(e)}")
+                self.catalog = None
+                return
+            # Another process may have replaced it with a newer CSV in between
+            if catalog is None or catalog.digest != fingerprint.digest:
+                self.catalog = None
+                return
+        self.catalog = catalog
+        self.index = catalog.index
+        self.df = None
+        self._rows_by_name, self._row_by_id = None, None
+        # The one writable per-process array: stock, overlaid from the database
+        self._stock = np.array(catalog.column('quantity'), dtype=np.int32)
+
+    def _load_snapshot(self, fingerprint: FileFingerprint) -> bool:
+        """Restore the catalog and its indexes if the snapshot matches the CSV"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable catalog snapshot: {str(e)}")
+            return False
+        if (snapshot.get('format') != SNAPSHOT_FORMAT
+                or snapshot.get('digest') != fingerprint.digest
+                or snapshot.get('compact') != self.compact):
+            return False
+        self.df = snapshot['df']
+        self.index = snapshot['index']
+        self._rows_by_name = snapshot['rows_by_name']
+        self._row_by_id = snapshot['row_by_id']
+        return True
+
+    def _write_snapshot(self, fingerprint: FileFingerprint):
+        """Pickle the cleaned catalog and its indexes, replacing the old snapshot atomically"""
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            'format': SNAPSHOT_FORMAT,
+            'digest': fingerprint.digest,
+            'compact': self.compact,
+            'df': self.df,
+            'index': self.index,
+            'rows_by_name': self._rows_by_name,
+            'row_by_id': self._row_by_id,
+        }
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.snapshot')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Could not write catalog snapshot: {str(e)}")
+
+    def _read_chunks(self, source, first_id: int = 1) -> Iterator[pd.DataFrame]:
+        """Parse the catalog CSV `CSV_CHUNK_ROWS` rows at a time, cleaned and, in compact mode, compacted.
+
+        Chunks keep their row positions as index and ids continue across chunks.
+        """
+        usecols = (lambda col: col in CATALOG_COLUMNS) if self.compact else None
+        reader = pd.read_csv(source, dtype=CSV_DTYPES, usecols=usecols, chunksize=CSV_CHUNK_ROWS)
+        start = 0
+        with reader:
+            for chunk in reader:
+                chunk.index = pd.RangeIndex(start, start + len(chunk))
+                chunk = self._clean_data(chunk, first_id=first_id + start)
+                if self.compact:
+                    chunk = self._compact(chunk)
+                start += len(chunk)
+                yield chunk
+
+    @staticmethod
+    def _clean_data(df: pd.DataFrame, first_id: int = 1) -> pd.DataFrame:
+        """Normalize a raw catalog frame read from CSV"""
+        # Catalogs without an id column get ids from their row position
+        if 'id' not in df.columns:
+            df.insert(0, 'id', range(first_id, first_id + len(df)))
+        else:
+            df['id'] = pd.to_numeric(df['id'], errors='coerce')
+        
+        # Clean price column first - remove any currency symbols and convert to float
+        df['price(₹)'] = (df['price(₹)']
+                          .astype(str)
+                          .str.replace('₹', '', regex=False)
+                          .str.replace('Rs.', '', regex=False)
+                          .str.strip())
+        df['price(₹)'] = pd.to_numeric(df['price(₹)'], errors='coerce')
+        
+        df['name'] = df['name'].fillna('').astype(str)
+        
+        # Clean text columns
+        for col in TEXT_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].fillna('').astype(str).str.strip()
+            else:
+                df[col] = ''
+        
+        # Precompute the salt shown to users: "composition1, composition2"
+        second = df['short_composition2']
+        df['salt'] = df['short_composition1'].where(
+            second == '', df['short_composition1'] + ', ' + second
+        )
+        
+        # Convert boolean column; the flag is read as text, so parse its spellings
+        if 'Is_discontinued' in df.columns:
+            flag = df['Is_discontinued']
+            if not pd.api.types.is_bool_dtype(flag):
+                flag = flag.astype(str).str.strip().str.lower().isin(TRUE_VALUES)
+            df['Is_discontinued'] = flag.astype(bool)
+        
+        # Add quantity column if it doesn't exist
+        if 'quantity' not in df.columns:
+            df['quantity'] = 100  # Default quantity for existing products
+        else:
+            df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0).astype(int)
+        
+        # Text columns are filled above; numeric ones keep NaN so they stay numeric
+        return df
+
+    @staticmethod
+    def _compact(df: pd.DataFrame) -> pd.DataFrame:
+        """Shrink a cleaned catalog: repeated text as categoricals, narrow integers"""
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        df['quantity'] = df['quantity'].astype(np.int32)
+        df['id'] = pd.to_numeric(df['id'], downcast='integer')
+        if 'Is_discontinued' in df.columns:
+            df['Is_discontinued'] = df['Is_discontinued'].astype(bool)
+        # The same name repeats across pack sizes and makers; keep one copy of each
+        df['name'] = pd.Series([sys.intern(name) for name in df['name'].tolist()],
+                               index=df.index, dtype=object)
+        return df
+
+    def memory_usage(self) -> Dict:
+        """Bytes held by the catalog frame (per column), search index and lookups.
+
+        With a shared catalog only the stock array is private to this process;
+        `shared` is the size of the mapped file.
+        """
+        if self.catalog is not None:
+            return {
+                'rows': len(self.catalog),
+                'shared': self.catalog.nbytes,
+                'stock': self._stock.nbytes,
+                'total': self._stock.nbytes,
+            }
+        columns = self.df.memory_usage(deep=True, index=False)
+        lookups = sys.getsizeof(self._rows_by_name) + sys.getsizeof(self._row_by_id)
+        lookups += sum(sys.getsizeof(rows) for rows in self._rows_by_name.values())
+        report = {
+            'rows': len(self.df),
+            'columns': {col: int(size) for col, size in columns.items()},
+            'catalog': int(columns.sum()),
+            'search_index': self.index.memory_usage(),
+            'lookups': lookups,
+        }
+        report['total'] = report['catalog'] + report['search_index'] + report['lookups']
+        return report
+
+    def _current_fingerprint(self) -> FileFingerprint:
+        stat = os.stat(self.csv_path)
+        return FileFingerprint(stat.st_mtime_ns, stat.st_size, _hash_file(self.csv_path))
+
+    def invalidate(self):
+        """Force a full reload from disk on the next access"""
+        self._stale = True
+
+    def refresh(self) -> bool:
+        """Reload the catalog if the CSV changed on disk. Returns True if data was reloaded.
+
+        Stock changed in the database by other processes is picked up as well.
+        """
+        with self._lock:
+            if self._refresh():
+                return True
+            if self.storage is not None and self._stock_version != self.storage.stock_version():
+                self._sync_stock()
+            return False
+
+    def _refresh(self) -> bool:
+        if not os.path.exists(self.csv_path):
+            return False
+        if self._stale or self._fingerprint is None:
+            self._load_data()
+            return True
+
+        stat = os.stat(self.csv_path)
+        old = self._fingerprint
+        if stat.st_mtime_ns == old.mtime_ns and stat.st_size == old.size:
+            return False
+
+        # mtime/size moved: only pay for a reload if the bytes actually differ
+        digest = _hash_file(self.csv_path)
+        if digest == old.digest:
+            self._fingerprint = FileFingerprint(stat.st_mtime_ns, stat.st_size, digest)
+            return False
+
+        # The shared file is rebuilt as a whole, so appends only help private copies
+        if (not self.shared_path and stat.st_size > old.size
+                and _hash_file(self.csv_path, old.size) == old.digest):
+            self._load_appended_rows(old.size, FileFingerprint(stat.st_mtime_ns, stat.st_size, digest))
+        else:
+            self._load_data()
+        return True
+
+    @CATALOG_LOAD_SECONDS.time(source='append')
+    def _load_appended_rows(self, offset: int, fingerprint: FileFingerprint):
+        """Incremental reload: parse only the rows appended after `offset` bytes"""
+        # A previous read that stopped mid-line cannot be extended safely
+        if not self._ends_with_newline(offset):
+            self._load_data()
+            return
+        with open(self.csv_path, 'rb') as f:
+            header = f.readline()
+            f.seek(offset)
+            tail = f.read()
+        start = len(self.df)
+        chunks = list(self._read_chunks(io.BytesIO(header + tail), first_id=start + 1))
+        self._fingerprint = fingerprint
+        if not chunks:
+            return
+        self.df = pd.concat([self.df, _concat_chunks(chunks)], ignore_index=True)
+        if self.compact:
+            self.df = self._compact(self.df)
+        self.index = SearchIndex.build(self.df)
+        # Appended rows keep earlier positions valid, so only index the new ones
+        self._index_rows(start)
+        self._write_snapshot(fingerprint)
+        self.query_cache.clear()
+        self._sync_stock()
+        self._version += 1
+
+    def _ends_with_newline(self, offset: int) -> bool:
+        with open(self.csv_path, 'rb') as f:
+            f.seek(offset - 1)
+            return f.read(1) == b'\n'
+
+    def _sync_stock(self):
+        """Store products the database has not seen and take stock levels from it"""
+        if self.storage is None:
+            return
+        # Read first, so a change made while the levels are loaded shows up next time
+        self._stock_version = self.storage.stock_version()
+        stock = self.storage.stock()
+        # Compare ids, not counts: a catalog swapped for one of the same size
+        # still has products the database has never stored
+        ids = self.df['id'].to_numpy() if self.catalog is None else self.catalog.column('id')
+        missing = np.flatnonzero(~np.isin(ids, stock.index.to_numpy()))
+        if len(missing):
+            new_rows = self.df.iloc[missing] if self.catalog is None else self.catalog.to_frame(missing)
+            self.storage.import_products(new_rows)
+        if self.catalog is None:
+            quantity = self.df['quantity']
+            self.df['quantity'] = self.df['id'].map(stock).fillna(quantity).astype(quantity.dtype)
+        else:
+            ids = pd.Series(self.catalog.column('id'))
+            self._stock = ids.map(stock).fillna(pd.Series(self._stock)).to_numpy(dtype=np.int32)
+        quantities = self._quantities()
+        self.query_cache.patch(lambda ranked: ranked.restock(quantities))
+
+    def _quantities(self) -> np.ndarray:
+        """Stock level of every row, by row position"""
+        return self.df['quantity'].to_numpy() if self.catalog is None else self._stock
+
+    def _index_rows(self, start: int):
+        """Add rows from position `start` onwards to the point lookup tables"""
+        names = self.df['name'].iloc[start:].str.lower().tolist()
+        ids = self.df['id'].iloc[start:].tolist()
+        for row, (name, product_id) in enumerate(zip(names, ids), start):
+            self._rows_by_name.setdefault(name, []).append(row)
+            self._row_by_id[product_id] = row
+
+    def _name_rows(self, name: str) -> np.ndarray:
+        if self._rows_by_name is None:
+            return self.index.rows_with_name(name.lower())
+        return np.asarray(self._rows_by_name.get(name.lower(), EMPTY_ROWS), dtype=np.int64)
+
+    def _id_rows(self, product_ids) -> np.ndarray:
+        """Row position of each product id, -1 for ids not in the catalog"""
+        if self.catalog is None:
+            return np.fromiter((self._row_by_id.get(int(pid), -1) for pid in product_ids),
+                               dtype=np.int64, count=len(product_ids))
+        return self.catalog.rows_with_ids(product_ids)
+
+    def apply_stock_changes(self, product_ids: np.ndarray, quantities: np.ndarray,
+                            before: Optional[int] = None, after: Optional[int] = None):
+        """Set stock levels by product id in memory, e.g. after a bulk feed, without a reload.
+
+        `before`/`after` are the database stock versions around the change;
+        when nothing else changed stock in between, our copy stays in sync.
+        """
+        with self._lock:
+            rows = self._id_rows(product_ids)
+            found = rows >= 0
+            rows, quantities = rows[found], np.asarray(quantities)[found]
+            if self.catalog is not None:
+                self._stock[rows] = quantities
+            else:
+                col = self.df.columns.get_loc('quantity')
+                self.df.iloc[rows, col] = quantities.astype(self.df['quantity'].dtype)
+            current = self._quantities()
+            self.query_cache.patch(lambda ranked: ranked.restock(current, rows))
+            if before is not None and before == self._stock_version:
+                self._stock_version = after
+
+    def place_order(self, items: List[Dict]):
+        """Check and take order lines out of stock atomically, then record them.
+
+        `items` are order lines as stored in orders.csv, naming their
+        product by `product_id`. With a database the check, decrement and
+        insert happen in one locked transaction; the in-memory catalog is
+        patched afterwards. Raises OutOfStockError and changes nothing if any
+        line asks for more than is in stock.
+        """
+        with self._lock:
+            if self.storage is not None:
+                try:
+                    levels, before, after = self.storage.place_order(items)
+                except OutOfStockError as e:
+                    # Another process sold it; show the real level from now on
+                    self.apply_stock_changes([e.product_id], [e.available])
+                    raise
+                # Nobody else touched stock since our last sync, so taking the
+                # new levels leaves our copy current without a reload
+                self.apply_stock_changes(list(levels), list(levels.values()), before, after)
+                return
+            needed, names = defaultdict(int), {}
+            for item in items:
+                needed[int(item['product_id'])] += item['quantity']
+                names[int(item['product_id'])] = item['medicine_name']
+            product_ids = list(needed)
+            rows = self._id_rows(product_ids)
+            quantities = self._quantities()
+            levels = []
+            for product_id, row in zip(product_ids, rows):
+                available = int(quantities[row]) if row >= 0 else 0
+                if available < needed[product_id]:
+                    raise OutOfStockError(names[product_id], available, product_id)
+                levels.append(available - needed[product_id])
+            self.apply_stock_changes(product_ids, levels)
+
+    def update_order_statuses(self, changes: List[Tuple[str, str]]) -> List[Dict]:
+        """Apply (order_id, status) changes in one transaction and patch the stock they move.
+
+        Stock returned by cancellations or taken by reopened orders is applied
+        to the in-memory catalog as well. Returns a result per change; see
+        Storage.update_statuses.
+        """
+        with self._lock:
+            results, levels, before, after = self.storage.update_statuses(changes)
+            self.apply_stock_changes(list(levels), list(levels.values()), before, after)
+            return results
+    
+    @MATERIALIZE_SECONDS.time()
+    def _materialize(self, rows: np.ndarray, limit: Optional[int] = None) -> List[Dict]:
+        """Build product dicts for the given row positions, column by column"""
+        if limit is not None:
+            rows = rows[:limit]
+        if self.catalog is None:
+            subset = self.df.iloc[rows]
+            columns = {key: subset[col] for key, col in RESULT_COLUMNS.items()}
+        else:
+            columns = {key: pd.Series(self.catalog.take(col, rows)) for key, col in RESULT_COLUMNS.items()}
+            columns['quantity'] = pd.Series(self._stock[rows])
+        columns['price'] = columns['price'].fillna(0.0).astype(float)
+        columns['quantity'] = columns['quantity'].astype(int)
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*(col.tolist() for col in columns.values()))]
+
+    def _match(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows matching the query and their relevance scores, best first"""
+        start = time.perf_counter()
+        tier, rows, scores = self._match_tiers(query)
+        MATCH_SECONDS.observe(time.perf_counter() - start, tier=tier)
+        return rows, scores
+
+    def _match_tiers(self, query: str) -> Tuple[str, np.ndarray, np.ndarray]:
+        """_match, plus the name of the tier that found the rows"""
+        # Convert query to lowercase and split into terms
+        search_terms = query.lower().split()
+        if not search_terms:
+            return 'empty', EMPTY_ROWS, EMPTY_SCORES
+        tokens = tokenize(query)
+        
+        # First try exact match using lowercase name
+        rows = self._name_rows(query)
+        if len(rows):
+            return 'exact', rows, np.full(len(rows), float(len(tokens) + 1))
+        
+        # Try matching products that start with the first search term,
+        # ranking names that also contain the other terms higher
+        rows = self.index.rows_with_name_prefix(search_terms[0])
+        if len(rows):
+            names = self._lower_names(rows)
+            scores = np.ones(len(rows))
+            for term in tokens[1:]:
+                scores += names.str.contains(re.escape(term), regex=True).to_numpy(dtype=bool)
+            return ('prefix',) + self._by_score(rows, scores)
+        
+        # Candidates containing every term in any indexed column; names that
+        # contain all terms in sequence come first
+        rows = self.index.rows_with_all_tokens(tokens)
+        if len(rows):
+            in_sequence = '.*'.join(re.escape(term) for term in tokens)
+            names = self._lower_names(rows)
+            scores = 1.0 + names.str.contains(in_sequence, regex=True).to_numpy(dtype=bool)
+            return ('tokens',) + self._by_score(rows, scores)
+        
+        # Tolerate typos: closest spellings first
+        rows, scores = self.index.fuzzy_match(tokens)
+        return ('fuzzy',) + self._by_score(rows, scores)
+
+    def _lower_names(self, rows: np.ndarray) -> pd.Series:
+        if self.catalog is None:
+            return self.df['name'].iloc[rows].str.lower()
+        return pd.Series(self.catalog.take('name', rows), dtype=object).str.lower()
+
+    @staticmethod
+    def _by_score(rows: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+    def _ranked_rows(self, query: str) -> RankedRows:
+        """Cached _match, so repeated queries and paging do not redo the search"""
+        key = (' '.join(query.lower().split()), self._version)
+        ranked = self.query_cache.get(key)
+        SEARCH_CACHE.inc(result='miss' if ranked is None else 'hit')
+        if ranked is None:
+            ranked = RankedRows(*self._match(query), self._quantities())
+            self.query_cache.put(key, ranked)
+        return ranked
+
+    def cache_stats(self) -> Dict:
+        """Hit, miss and eviction counts of the search cache"""
+        with self._lock:
+            return self.query_cache.stats()
+
+    @SEARCH_SECONDS.time(call='search_products')
+    def search_products(self, query: str, limit: Optional[int] = None) -> List[Dict]:
+        """Search products with a more flexible matching algorithm.
+
+        Only the first `limit` matches are turned into dicts when a limit is given.
+        """
+        try:
+            # Pick up catalog changes on disk without re-reading an unchanged file
+            self.refresh()
+            with self._lock:
+                return self._materialize(self._ranked_rows(query).rows, limit)
+
+        except Exception as e:
+            print(f"Error in search_products: {str(e)}")
+            return []
+
+    @SEARCH_SECONDS.time(call='search_page')
+    def search_page(self, query: str, offset: int = 0, limit: int = 10,
+                    in_stock_only: bool = True) -> Dict:
+        """One page of search results ranked by relevance and stock.
+
+        Returns a dict with the page's `items`, the `total` number of matches
+        and the `offset`/`limit` used. Out-of-stock products are dropped when
+        `in_stock_only` is set, otherwise they are listed after in-stock ones.
+        """
+        try:
+            self.refresh()
+            with self._lock:
+                ranked = self._ranked_rows(query)
+                rows, in_stock = ranked.rows, ranked.in_stock
+                if in_stock_only:
+                    rows = rows[in_stock]
+                else:
+                    rows = rows[np.argsort(~in_stock, kind='stable')]
+                offset = max(0, offset)
+                return {
+                    'items': self._materialize(rows[offset:offset + limit]),
+                    'total': len(rows),
+                    'offset': offset,
+                    'limit': limit,
+                }
+
+        except Exception as e:
+            print(f"Error in search_page: {str(e)}")
+            return {'items': [], 'total': 0, 'offset': offset, 'limit': limit}
+
+    def get_product_by_name(self, name: str) -> Optional[Dict]:
+        """Get medicine details by name"""
+        try:
+            # Pick up catalog changes on disk without re-reading an unchanged file
+            self.refresh()
+            
+            with self._lock:
+                rows = self._name_rows(name)
+                if len(rows):
+                    return self._materialize(rows, 1)[0]
+            return None
+        except Exception as e:
+            print(f"Error in get_product_by_name: {str(e)}")
+            return None
+
+    def get_product_by_id(self, product_id: int) -> Optional[Dict]:
+        """Get medicine details by product id"""
+        try:
+            self.refresh()
+            
+            with self._lock:
+                if self.catalog is None:
+                    row = self._row_by_id.get(product_id)
+                else:
+                    row = self.catalog.row_with_id(product_id)
+                if row is not None:
+                    return self._materialize(np.array([row]))[0]
+            return None
+        except Exception as e:
+            print(f"Error in get_product_by_id: {str(e)}")
+            return None
+
+    @SEARCH_SECONDS.time(call='get_products_by_ids')
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[int, Dict]:
+        """Medicine details for several product ids at once; unknown ids are left out"""
+        try:
+            self.refresh()
+
+            with self._lock:
+                if self.catalog is None:
+                    found = [(pid, self._row_by_id.get(pid)) for pid in product_ids]
+                else:
+                    found = [(pid, self.catalog.row_with_id(pid)) for pid in product_ids]
+                found = [(pid, row) for pid, row in found if row is not None]
+                products = self._materialize(np.array([row for _, row in found], dtype=np.int64))
+                return {pid: product for (pid, _), product in zip(found, products)}
+        except Exception as e:
+            print(f"Error in get_products_by_ids: {str(e)}")
+            return {}
\ No newline at end of file
@@ -0,0 +1,292 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Iterable, Tuple
+import re
+
+# Catalog columns whose words are searchable
+INDEXED_COLUMNS = ['name', 'short_composition1', 'short_composition2', 'type']
+
+TOKEN_PATTERN = r'[^\W_]+'
+
+# Index keys are UTF-8 bytes in fixed-width arrays, so they can be memory
+# mapped. 0xff never occurs in UTF-8, so [prefix, prefix + PREFIX_END) spans
+# all keys starting with prefix
+PREFIX_END = b'\xff'
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+# Constructor arguments of SearchIndex, all plain numpy arrays
+ARRAY_NAMES = [
+    'vocabulary', 'offsets', 'postings', 'sorted_names', 'name_order',
+    'gram_keys', 'gram_offsets', 'gram_postings'
+]
+
+# Query words shorter than this are never fuzzy matched
+MIN_FUZZY_LENGTH = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into the lowercase words used as index keys"""
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+def trigrams(word: str) -> List[str]:
+    """Padded character trigrams; a word of length n has n of them"""
+    padded = f'${word}$'
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def max_edits(word: str) -> int:
+    """Typos tolerated for a query word of this length"""
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def as_keys(values) -> np.ndarray:
+    """Encode strings as a sortable fixed-width UTF-8 byte array"""
+    keys = np.array([value.encode('utf-8') for value in values], dtype=bytes)
+    # A zero-width bytes dtype cannot be stored or mapped
+    return keys if keys.dtype.itemsize else keys.astype('S1')
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchIndex:
+    """Inverted token index plus a sorted name array over a catalog DataFrame.
+
+    Row ids are positions in the DataFrame the index was built from. Words,
+    names and trigrams are UTF-8 byte strings (see as_keys). Posting lists are stored back to back in one array (CSR layout): the rows for
+    vocabulary[i] are postings[offsets[i]:offsets[i + 1]], sorted ascending.
+    A second CSR index maps character trigrams to vocabulary ids for the
+    typo-tolerant tier.
+    """
+
+    def __init__(self, vocabulary: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                 sorted_names: np.ndarray, name_order: np.ndarray,
+                 gram_keys: np.ndarray, gram_offsets: np.ndarray, gram_postings: np.ndarray):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+        self.sorted_names = sorted_names
+        self.name_order = name_order
+        self.gram_keys = gram_keys
+        self.gram_offsets = gram_offsets
+        self.gram_postings = gram_postings
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> 'SearchIndex':
+        """Tokenize the indexed columns of a catalog frame"""
+        builder = IndexBuilder()
+        builder.add(df)
+        return builder.finish()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The index arrays by constructor argument name, for saving to disk"""
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    @staticmethod
+    def _build_trigrams(vocabulary: np.ndarray):
+        """CSR index from trigram to the ids of vocabulary words containing it"""
+        grams, word_ids = [], []
+        for word_id, word in enumerate(vocabulary):
+            # One typo away from the shortest fuzzy query is as short as it gets
+            if len(word) < MIN_FUZZY_LENGTH - 1:
+                continue
+            word_grams = set(trigrams(word))
+            grams.extend(word_grams)
+            word_ids.extend([word_id] * len(word_grams))
+        if not grams:
+            return as_keys([]), np.zeros(1, dtype=np.int64), EMPTY_ROWS.copy()
+
+        grams = as_keys(grams)
+        word_ids = np.array(word_ids, dtype=np.int64)
+        order = np.lexsort((word_ids, grams))
+        keys, starts = np.unique(grams[order], return_index=True)
+        return keys, np.append(starts, len(order)).astype(np.int64), word_ids[order]
+
+    def memory_usage(self) -> int:
+        """Bytes held by the index arrays"""
+        return sum(array.nbytes for array in self.arrays().values())
+
+    def _span(self, values: np.ndarray, prefix: str):
+        prefix = prefix.encode('utf-8')
+        lo = np.searchsorted(values, prefix, side='left')
+        hi = np.searchsorted(values, prefix + PREFIX_END, side='left')
+        return lo, hi
+
+    def rows_with_name(self, name: str) -> np.ndarray:
+        """Rows whose lowercase name equals `name` (already lowercased)"""
+        key = name.encode('utf-8')
+        lo = np.searchsorted(self.sorted_names, key, side='left')
+        hi = np.searchsorted(self.sorted_names, key, side='right')
+        return np.sort(self.name_order[lo:hi])
+
+    def rows_with_name_prefix(self, prefix: str) -> np.ndarray:
+        """Rows whose lowercase name starts with `prefix`"""
+        lo, hi = self._span(self.sorted_names, prefix)
+        return np.sort(self.name_order[lo:hi])
+
+    def rows_with_token(self, term: str) -> np.ndarray:
+        """Rows containing a word that starts with `term` in any indexed column"""
+        lo, hi = self._span(self.vocabulary, term)
+        if lo == hi:
+            return EMPTY_ROWS
+        if hi - lo == 1:
+            return self.postings[self.offsets[lo]:self.offsets[hi]]
+        return np.unique(self.postings[self.offsets[lo]:self.offsets[hi]])
+
+    def rows_with_all_tokens(self, terms: Iterable[str]) -> np.ndarray:
+        """Rows matching every term, intersecting the smallest posting lists first"""
+        postings = sorted((self.rows_with_token(term) for term in terms), key=len)
+        if not postings:
+            return EMPTY_ROWS
+        rows = postings[0]
+        for other in postings[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def _fuzzy_words(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Vocabulary ids within max_edits(term) of term, with their similarity"""
+        limit = max_edits(term)
+        if not limit or not len(self.gram_keys):
+            return EMPTY_ROWS, EMPTY_SCORES
+
+        # Each edit destroys at most three trigrams, so anything within the
+        # limit shares at least len(term) - 3 * limit of them with the term
+        term_grams = sorted(gram.encode('utf-8') for gram in set(trigrams(term)))
+        lo = np.searchsorted(self.gram_keys, term_grams, side='left')
+        found = [i for i, gram in zip(lo, term_grams)
+                 if i < len(self.gram_keys) and self.gram_keys[i] == gram]
+        if not found:
+            return EMPTY_ROWS, EMPTY_SCORES
+        hits = np.concatenate([self.gram_postings[self.gram_offsets[i]:self.gram_offsets[i + 1]]
+                               for i in found])
+        word_ids, shared = np.unique(hits, return_counts=True)
+        word_ids = word_ids[shared >= max(1, len(term) - 3 * limit)]
+
+        ids, scores = [], []
+        for word_id in word_ids:
+            word = self.vocabulary[word_id].decode('utf-8')
+            distance = edit_distance(term, word, limit)
+            if distance <= limit:
+                ids.append(word_id)
+                scores.append(1.0 - distance / max(len(term), len(word)))
+        return np.array(ids, dtype=np.int64), np.array(scores, dtype=np.float64)
+
+    def _term_scores(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows matching term exactly or fuzzily, each with its best similarity"""
+        lo, hi = self._span(self.vocabulary, term)
+        word_ids, scores = self._fuzzy_words(term)
+        word_ids = np.concatenate([np.arange(lo, hi, dtype=np.int64), word_ids])
+        scores = np.concatenate([np.ones(hi - lo), scores])
+        if not len(word_ids):
+            return EMPTY_ROWS, EMPTY_SCORES
+
+        lengths = self.offsets[word_ids + 1] - self.offsets[word_ids]
+        rows = np.concatenate([self.postings[self.offsets[i]:self.offsets[i + 1]] for i in word_ids])
+        row_scores = np.repeat(scores, lengths)
+        # Keep the best score per row: sort by score descending, take first occurrence
+        order = np.argsort(-row_scores, kind='mergesort')
+        rows, first = np.unique(rows[order], return_index=True)
+        return rows, row_scores[order][first]
+
+    def fuzzy_match(self, terms: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows where every term matches a word within a few typos.
+
+        Returns the rows and their summed similarity (1.0 per exact word).
+        """
+        rows, scores = None, None
+        for term in terms:
+            term_rows, term_scores = self._term_scores(term)
+            if rows is None:
+                rows, scores = term_rows, term_scores
+            else:
+                rows, left, right = np.intersect1d(rows, term_rows, assume_unique=True, return_indices=True)
+                scores = scores[left] + term_scores[right]
+            if not len(rows):
+                break
+        if rows is None:
+            return EMPTY_ROWS, EMPTY_SCORES
+        return rows, scores
+
+
+class IndexBuilder:
+    """Builds a SearchIndex from a catalog one chunk of rows at a time.
+
+    Chunks are added in row order. Words are kept as integer ids into a
+    growing vocabulary, so what is held between chunks is a few integer
+    arrays rather than the tokenized text.
+    """
+
+    def __init__(self):
+        self._word_ids: Dict[str, int] = {}
+        self._pairs: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._names: List[np.ndarray] = []
+        self._rows = 0
+
+    def add(self, df: pd.DataFrame):
+        """Tokenize the next `len(df)` rows"""
+        row_ids = np.arange(self._rows, self._rows + len(df), dtype=np.int64)
+        pairs = []
+        for col in INDEXED_COLUMNS:
+            if col not in df.columns:
+                continue
+            words = pd.Series(df[col].to_numpy(), index=row_ids).astype(str).str.lower()
+            words = words[words != 'nan'].str.findall(TOKEN_PATTERN).explode().dropna()
+            pairs.append(pd.DataFrame({'token': words.to_numpy(), 'row': words.index.to_numpy()}))
+        if pairs:
+            pairs = pd.concat(pairs, ignore_index=True).drop_duplicates()
+            for token in pd.unique(pairs['token']):
+                self._word_ids.setdefault(token, len(self._word_ids))
+            # Half-width while collecting; postings are widened once sorted
+            word_ids = pairs['token'].map(self._word_ids).to_numpy(dtype=np.int32)
+            self._pairs.append((word_ids, pairs['row'].to_numpy(dtype=np.int32)))
+        if 'name' in df.columns:
+            self._names.append(as_keys(df['name'].astype(str).str.lower()))
+        self._rows += len(df)
+
+    def finish(self) -> SearchIndex:
+        """Sort the collected words and rows into the index arrays"""
+        vocabulary = np.array(list(self._word_ids), dtype=object)
+        if self._pairs:
+            word_ids = np.concatenate([ids for ids, _ in self._pairs])
+            rows = np.concatenate([rows for _, rows in self._pairs])
+        else:
+            word_ids, rows = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        self._pairs = []
+
+        # Renumber words in sorted order, then sort postings by word and row
+        order = np.argsort(vocabulary, kind='mergesort') if len(vocabulary) else EMPTY_ROWS
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        word_ids = rank[word_ids]
+        pair_order = np.lexsort((rows, word_ids))
+        postings = rows[pair_order].astype(np.int64)
+        del rows, pair_order
+        counts = np.bincount(word_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        vocabulary = vocabulary[order]
+
+        names = np.concatenate(self._names) if self._names else as_keys([])
+        name_order = np.argsort(names, kind='mergesort').astype(np.int64)
+
+        gram_keys, gram_offsets, gram_postings = SearchIndex._build_trigrams(vocabulary)
+        return SearchIndex(as_keys(vocabulary), offsets, postings, names[name_order], name_order,
+                           gram_keys, gram_offsets, gram_postings)
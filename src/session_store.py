@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Sessions untouched for this long are forgotten, in memory and on disk
+SESSION_TTL = 7 * 24 * 3600
+
+# Seconds between batched writes of changed sessions
+SESSION_FLUSH_INTERVAL = 5
+
+
+class SessionPersistence(BasePersistence):
+    """Keeps the bot's user_data (cart, last search, checkout step) in SQLite.
+
+    Handlers only touch the in-memory dicts. Every `update_interval` seconds
+    the application hands over the users whose data changed; they are
+    queued here and written together in one transaction on a worker thread,
+    so an update never waits for the disk. Sessions idle for longer than
+    `ttl` seconds are not loaded, and idle_users() names the ones to drop
+    from memory.
+
+    Only user data is stored; chat data, bot data and conversations are not
+    used by the bot.
+    """
+
+    def __init__(self, storage: Storage, ttl: float = SESSION_TTL,
+                 update_interval: float = SESSION_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.storage = storage
+        self.ttl = ttl
+        self._last_seen: Dict[int, float] = {}
+        self._pending: Dict[int, str] = {}
+        self._drops = set()
+        self._writer: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _encode(data: Dict) -> str:
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+    def idle_users(self, now: Optional[float] = None) -> List[int]:
+        """Users whose session has been idle for longer than the TTL"""
+        cutoff = (now or time.time()) - self.ttl
+        return [user_id for user_id, seen in self._last_seen.items() if seen < cutoff]
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        since = time.time() - self.ttl
+        rows = await asyncio.get_running_loop().run_in_executor(None, self.storage.load_sessions, since)
+        user_data = {}
+        for user_id, data, updated_at in rows:
+            user_data[user_id] = json.loads(data)
+            self._last_seen[user_id] = updated_at
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        # Called for every user seen since the last run, so this doubles as activity tracking
+        self._last_seen[user_id] = time.time()
+        self._drops.discard(user_id)
+        self._pending[user_id] = self._encode(data)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int):
+        self._last_seen.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        self._drops.add(user_id)
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        pass
+
+    def _schedule_write(self):
+        # One writer per run: the application stages every changed user before it gets to go
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    def _take_batch(self):
+        updates = [(user_id, data, self._last_seen.get(user_id, time.time()))
+                   for user_id, data in self._pending.items()]
+        drops = list(self._drops)
+        self._pending, self._drops = {}, set()
+        return updates, drops
+
+    async def _write(self):
+        await asyncio.sleep(0)
+        updates, drops = self._take_batch()
+        if not (updates or drops):
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.storage.save_sessions, updates, drops)
+        except Exception as e:
+            logger.error(f"Error saving sessions: {str(e)}")
+            # Retry with the next batch unless newer data has been queued meanwhile
+            for user_id, data, _ in updates:
+                self._pending.setdefault(user_id, data)
+            self._drops.update(user_id for user_id in drops if user_id not in self._pending)
+
+    async def flush(self):
+        """Write whatever is still queued; called once on shutdown"""
+        if self._writer is not None:
+            await self._writer
+        updates, drops = self._take_batch()
+        if updates or drops:
+            self.storage.save_sessions(updates, drops)
+        self.storage.expire_sessions(time.time() - self.ttl)
+
+    # Unused kinds of data
+
+    async def get_chat_data(self) -> Dict:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
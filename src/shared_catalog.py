@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from search_index import SearchIndex
+
+# File signature; bump the trailing version when the layout changes
+MAGIC = b'MEDCAT01'
+
+# Arrays start on cache-line boundaries inside the file
+ALIGNMENT = 64
+
+# Catalog columns stored as plain numbers
+NUMERIC_COLUMNS = {
+    'id': np.int64,
+    'price(₹)': np.float64,
+    'Is_discontinued': np.bool_,
+    'quantity': np.int32,
+}
+
+# Catalog columns stored as text
+TEXT_COLUMNS = [
+    'name', 'manufacturer_name', 'type', 'pack_size_label',
+    'short_composition1', 'short_composition2', 'salt'
+]
+
+
+def _encode_text(values) -> Dict[str, np.ndarray]:
+    """Distinct strings as one UTF-8 buffer plus offsets, and a code per row"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(''), sort=False)
+    encoded = [value.encode('utf-8') for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        'codes': codes.astype(np.int32),
+        'offsets': offsets,
+        'data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+    }
+
+
+class SharedCatalog:
+    """Cleaned catalog, search index and id lookup in one read-only mapped file.
+
+    Every process that opens the same file maps the same pages, so the
+    catalog is held once by the OS page cache however many workers use it.
+    Text is decoded only for the rows asked for. Stock is not kept here:
+    quantity is the level the CSV was loaded with, and each process overlays
+    the live levels from the database.
+    """
+
+    def __init__(self, path: str, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.path = path
+        self.arrays = arrays
+        self.meta = meta
+        self.digest = meta.get('digest')
+        self.index = SearchIndex(**{name: arrays[f'index.{name}'] for name in meta['index']})
+
+    @staticmethod
+    def write(path: str, df: pd.DataFrame, index: SearchIndex, digest: str):
+        """Write a catalog file, replacing any previous one atomically"""
+        arrays = {}
+        for col, dtype in NUMERIC_COLUMNS.items():
+            if col in df.columns:
+                # Prices keep NaN for "unknown"; the other columns cannot hold it
+                missing = np.nan if dtype is np.float64 else 0
+                arrays[f'column.{col}'] = df[col].to_numpy(dtype=dtype, na_value=missing)
+        for col in TEXT_COLUMNS:
+            if col in df.columns:
+                for part, array in _encode_text(df[col].astype(object)).items():
+                    arrays[f'text.{col}.{part}'] = array
+        ids = arrays['column.id']
+        id_order = np.argsort(ids, kind='mergesort').astype(np.int64)
+        arrays['lookup.sorted_ids'] = ids[id_order]
+        arrays['lookup.id_order'] = id_order
+        for name, array in index.arrays().items():
+            arrays[f'index.{name}'] = array
+
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header = json.dumps({
+            'digest': digest,
+            'rows': len(df),
+            'index': list(index.arrays()),
+            'arrays': layout,
+        }).encode('utf-8')
+        # Array offsets are relative to the end of the padded header
+        header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.shared')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                f.write(len(header).to_bytes(8, 'little'))
+                f.write(header)
+                start = f.tell()
+                for name, array in arrays.items():
+                    f.seek(start + layout[name]['offset'])
+                    f.write(np.ascontiguousarray(array).tobytes())
+                f.truncate(start + offset)
+            # Processes still mapping the old file keep reading it until they reopen
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def open(cls, path: str) -> Optional['SharedCatalog']:
+        """Map a catalog file read-only; None if it is missing or not one of ours"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            size = int.from_bytes(f.read(8), 'little')
+            meta = json.loads(f.read(size))
+            start = f.tell()
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        arrays = {}
+        for name, spec in meta['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            begin = start + spec['offset']
+            arrays[name] = buffer[begin:begin + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+        return cls(path, arrays, meta)
+
+    def __len__(self) -> int:
+        return self.meta['rows']
+
+    @property
+    def columns(self) -> List[str]:
+        names = [col for col in NUMERIC_COLUMNS if f'column.{col}' in self.arrays]
+        return names + [col for col in TEXT_COLUMNS if f'text.{col}.codes' in self.arrays]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mapped file, shared by every process that opens it"""
+        return os.path.getsize(self.path)
+
+    def column(self, col: str) -> np.ndarray:
+        """A numeric column as a read-only array"""
+        return self.arrays[f'column.{col}']
+
+    def take(self, col: str, rows: np.ndarray) -> List:
+        """Values of one column for the given row positions"""
+        if f'column.{col}' in self.arrays:
+            return self.arrays[f'column.{col}'][rows].tolist()
+        codes = self.arrays[f'text.{col}.codes'][rows]
+        offsets = self.arrays[f'text.{col}.offsets']
+        data = self.arrays[f'text.{col}.data']
+        decoded = {code: data[offsets[code]:offsets[code + 1]].tobytes().decode('utf-8')
+                   for code in np.unique(codes).tolist()}
+        return [decoded[code] for code in codes.tolist()]
+
+    def row_with_id(self, product_id: int) -> Optional[int]:
+        sorted_ids = self.arrays['lookup.sorted_ids']
+        pos = int(np.searchsorted(sorted_ids, product_id))
+        if pos < len(sorted_ids) and sorted_ids[pos] == product_id:
+            return int(self.arrays['lookup.id_order'][pos])
+        return None
+
+    def rows_with_ids(self, product_ids: np.ndarray) -> np.ndarray:
+        """Row position of each product id, -1 where the id is unknown"""
+        sorted_ids = self.arrays['lookup.sorted_ids']
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(sorted_ids):
+            return np.full(len(product_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_ids, product_ids), len(sorted_ids) - 1)
+        found = sorted_ids[pos] == product_ids
+        return np.where(found, self.arrays['lookup.id_order'][pos], -1)
+
+    def to_frame(self, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Decode the given rows (the whole catalog by default) into a private DataFrame"""
+        if rows is None:
+            rows = np.arange(len(self))
+        return pd.DataFrame({col: self.take(col, rows) for col in self.columns})
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from typing import Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+
+# Feed rows applied per transaction; bounds memory and how long checkouts wait on the write lock
+FEED_CHUNK_ROWS = 50000
+
+# Columns of a normalized feed chunk
+FEED_COLUMNS = ['id', 'name', 'delta', 'quantity']
+
+# How a bare value column (qty/value) or a JSON {key: value} object is read
+FEED_MODES = ('delta', 'absolute')
+
+
+def feed_format(source, fmt: Optional[str] = None) -> str:
+    """`fmt` if given, else the feed format implied by the file name"""
+    if fmt:
+        return fmt
+    name = source if isinstance(source, str) else getattr(source, 'name', '') or ''
+    ext = os.path.splitext(str(name))[1].lower()
+    return {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(ext, 'csv')
+
+
+def _normalize(chunk: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Feed rows as id/name keys with a delta and/or an absolute quantity"""
+    chunk = chunk.rename(columns=lambda col: str(col).strip().lower())
+    value = next((col for col in ('qty', 'value') if col in chunk.columns), None)
+    if value is not None:
+        target = 'delta' if mode == 'delta' else 'quantity'
+        if target not in chunk.columns:
+            chunk = chunk.rename(columns={value: target})
+    if not {'id', 'name'} & set(chunk.columns):
+        raise ValueError('Stock feed needs an id or name column')
+    if not {'delta', 'quantity'} & set(chunk.columns):
+        raise ValueError('Stock feed needs a delta, quantity or qty column')
+    out = pd.DataFrame(index=chunk.index)
+    out['id'] = pd.to_numeric(chunk['id'], errors='coerce').astype('Int64') if 'id' in chunk.columns else pd.NA
+    out['name'] = chunk['name'].astype('string').str.strip() if 'name' in chunk.columns else pd.NA
+    for col in ('delta', 'quantity'):
+        values = pd.to_numeric(chunk[col], errors='coerce') if col in chunk.columns else np.nan
+        out[col] = pd.Series(values, index=chunk.index, dtype='float64').round().astype('Int64')
+    out['id'] = out['id'].astype('Int64')
+    out['name'] = out['name'].astype('string').replace('', pd.NA)
+    return out[FEED_COLUMNS].reset_index(drop=True)
+
+
+def read_feed(source, fmt: Optional[str] = None, mode: str = 'delta',
+              chunk_rows: int = FEED_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Read a supplier stock feed as an iterator of normalized chunks of at most `chunk_rows` rows.
+
+    `source` is a path, a file object or a DataFrame. CSV and NDJSON are streamed;
+    a JSON document is read whole and may be a list of records or an object
+    mapping product ids or names to values. Rows are keyed by `id` or `name`
+    and carry a `delta`, an absolute `quantity`, or a bare `qty`/`value`
+    read according to `mode`.
+    """
+    if mode not in FEED_MODES:
+        raise ValueError(f"Unknown feed mode '{mode}'; use one of {', '.join(FEED_MODES)}")
+    if isinstance(source, pd.DataFrame):
+        data = source
+    else:
+        fmt = feed_format(source, fmt)
+        if fmt == 'csv':
+            # Read as text and parsed by _normalize, so pandas does not guess types per chunk
+            return _normalized(pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+                                           na_values=[''], skipinitialspace=True), mode)
+        if fmt == 'ndjson':
+            return _normalized(pd.read_json(source, lines=True, chunksize=chunk_rows, dtype=False), mode)
+        if fmt != 'json':
+            raise ValueError(f"Unknown feed format '{fmt}'; use csv, json or ndjson")
+        if hasattr(source, 'read'):
+            data = json.load(source)
+        else:
+            with open(source, encoding='utf-8') as f:
+                data = json.load(f)
+        if isinstance(data, dict):
+            keys = pd.Series(list(data.keys()), dtype=object)
+            ids = pd.to_numeric(keys, errors='coerce')
+            data = pd.DataFrame({'id': ids, 'name': keys.where(ids.isna()), 'qty': list(data.values())})
+        else:
+            data = pd.DataFrame(data)
+    return _normalized((data.iloc[start:start + chunk_rows] for start in range(0, len(data), chunk_rows)), mode)
+
+
+def _normalized(chunks, mode: str) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        yield _normalize(chunk, mode)
+
+
+def apply_feed(source, storage, product_db=None, fmt: Optional[str] = None, mode: str = 'delta',
+               chunk_rows: int = FEED_CHUNK_ROWS) -> Dict:
+    """Apply a stock feed to the database chunk by chunk and to a live ProductDB.
+
+    Each chunk is one vectorized transaction. When `product_db` is given its
+    in-memory stock is patched with the changed rows, so it needs no reload;
+    other processes pick the new levels up from the database's stock version.
+    Returns counts and a frame of the changed products (id, name, old, new).
+    """
+    start = time.perf_counter()
+    summary = {'rows': 0, 'invalid': 0, 'unmatched': 0, 'changed': 0}
+    changes = []
+    for chunk in read_feed(source, fmt=fmt, mode=mode, chunk_rows=chunk_rows):
+        summary['rows'] += len(chunk)
+        valid = (chunk['id'].notna() | chunk['name'].notna()) & (chunk['delta'].notna() | chunk['quantity'].notna())
+        summary['invalid'] += int((~valid).sum())
+        chunk = chunk[valid]
+        if chunk.empty:
+            continue
+        changed, unmatched, before, after = storage.apply_stock_feed(chunk)
+        summary['unmatched'] += unmatched
+        summary['changed'] += len(changed)
+        if product_db is not None and len(changed):
+            product_db.apply_stock_changes(changed['id'].to_numpy(), changed['new'].to_numpy(), before, after)
+        changes.append(changed)
+    summary['changes'] = (pd.concat(changes, ignore_index=True) if changes
+                          else pd.DataFrame(columns=['id', 'name', 'old', 'new']))
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
@@ -0,0 +1,843 @@
+import sqlite3
+import threading
+import argparse
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
+import pandas as pd
+from metrics import CHECKOUT_SECONDS, COMPACTION_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL,
+    manufacturer_name TEXT,
+    type TEXT,
+    pack_size_label TEXT,
+    short_composition1 TEXT,
+    short_composition2 TEXT,
+    is_discontinued INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    user_id INTEGER,
+    user_name TEXT,
+    medicine_name TEXT,
+    product_id INTEGER,
+    quantity INTEGER NOT NULL,
+    price_per_unit REAL NOT NULL,
+    total_price REAL NOT NULL,
+    order_date TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    delivery_address TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders(order_date);
+
+-- Append-only status changes, folded into orders.status by compact()
+CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_events_order_id ON order_events(order_id, id);
+
+-- One row per order for the dashboard, kept current by the triggers below
+CREATE TABLE IF NOT EXISTS order_summaries (
+    order_id TEXT PRIMARY KEY,
+    user_name TEXT,
+    order_time TEXT,
+    order_day TEXT,
+    total_price REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    delivery_address TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_summaries_time ON order_summaries(status, order_time);
+CREATE INDEX IF NOT EXISTS idx_order_summaries_day ON order_summaries(status, order_day, order_time);
+CREATE INDEX IF NOT EXISTS idx_order_summaries_name ON order_summaries(status, user_name, order_time);
+
+CREATE TABLE IF NOT EXISTS order_status_totals (
+    status TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customers (
+    user_name TEXT PRIMARY KEY
+);
+
+CREATE TRIGGER IF NOT EXISTS orders_summarize AFTER INSERT ON orders
+BEGIN
+    INSERT INTO order_summaries
+        (order_id, user_name, order_time, order_day, total_price, status, delivery_address)
+    VALUES (NEW.order_id, NEW.user_name, datetime(NEW.order_date), date(NEW.order_date),
+            NEW.total_price, NEW.status, NEW.delivery_address)
+    ON CONFLICT(order_id) DO UPDATE SET total_price = total_price + excluded.total_price;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_events_summarize AFTER INSERT ON order_events
+BEGIN
+    UPDATE order_summaries SET status = NEW.status WHERE order_id = NEW.order_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_summaries_added AFTER INSERT ON order_summaries
+BEGIN
+    INSERT INTO order_status_totals (status, orders, revenue) VALUES (NEW.status, 1, NEW.total_price)
+    ON CONFLICT(status) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+    INSERT OR IGNORE INTO customers (user_name) SELECT NEW.user_name WHERE NEW.user_name IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_summaries_changed
+AFTER UPDATE OF status, total_price ON order_summaries
+BEGIN
+    UPDATE order_status_totals SET orders = orders - 1, revenue = revenue - OLD.total_price
+    WHERE status = OLD.status;
+    INSERT INTO order_status_totals (status, orders, revenue) VALUES (NEW.status, 1, NEW.total_price)
+    ON CONFLICT(status) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+END;
+
+-- Completed-order aggregates for the reports, kept current by AGGREGATE_TRIGGERS
+CREATE TABLE IF NOT EXISTS revenue_rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (period, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS medicine_sales (
+    medicine_name TEXT PRIMARY KEY,
+    units INTEGER NOT NULL,
+    revenue REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_medicine_sales_units ON medicine_sales(units);
+
+CREATE TABLE IF NOT EXISTS customer_spend (
+    user_name TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_customer_spend_revenue ON customer_spend(revenue);
+
+-- Bot user state (cart, last search) as compact JSON, written behind by SessionPersistence
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+
+-- Counts stock changes so processes can tell when their copy is out of date
+INSERT OR IGNORE INTO meta (key, value) VALUES ('stock_version', 0);
+CREATE TRIGGER IF NOT EXISTS products_stock_changed
+AFTER UPDATE OF quantity ON products WHEN OLD.quantity IS NOT NEW.quantity
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'stock_version';
+END;
+"""
+
+# Revenue rollup period -> SQL for an order's bucket, given its order_time.
+# Weeks start on Monday and are named by that date.
+ROLLUP_PERIODS = {
+    'day': "date({time})",
+    'week': "date({time}, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m', {time})",
+}
+
+
+def _aggregate_statements(row: str, sign: str, when: str, medicines: bool = True) -> str:
+    """Trigger statements that add (sign '+') or remove (sign '-') order
+    summary `row` (NEW or OLD) to or from the aggregates if `when` holds"""
+    buckets = ' UNION ALL '.join(
+        f"SELECT '{period}' AS period, {bucket.format(time=f'{row}.order_time')} AS bucket"
+        for period, bucket in ROLLUP_PERIODS.items()
+    )
+    statements = f"""
+    INSERT INTO revenue_rollups (period, bucket, orders, revenue)
+    SELECT period, bucket, {sign}1, {sign}{row}.total_price FROM ({buckets})
+    WHERE bucket IS NOT NULL AND {when}
+    ON CONFLICT(period, bucket) DO UPDATE
+    SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue;
+    INSERT INTO customer_spend (user_name, orders, revenue)
+    SELECT {row}.user_name, {sign}1, {sign}{row}.total_price
+    WHERE {row}.user_name IS NOT NULL AND {when}
+    ON CONFLICT(user_name) DO UPDATE
+    SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue;"""
+    if medicines:
+        statements += f"""
+    INSERT INTO medicine_sales (medicine_name, units, revenue)
+    SELECT medicine_name, {sign}sum(quantity), {sign}sum(total_price) FROM orders
+    WHERE order_id = {row}.order_id AND medicine_name IS NOT NULL AND {when}
+    GROUP BY medicine_name
+    ON CONFLICT(medicine_name) DO UPDATE
+    SET units = units + excluded.units, revenue = revenue + excluded.revenue;"""
+    return statements
+
+
+# Only completed orders are aggregated. An order moves in or out as a whole
+# when its status changes; lines added to an order that is already completed
+# (imported history) are added one at a time.
+AGGREGATE_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS order_summaries_aggregate_added
+AFTER INSERT ON order_summaries WHEN NEW.status = 'completed'
+BEGIN{_aggregate_statements('NEW', '+', '1', medicines=False)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_summaries_aggregate_status
+AFTER UPDATE OF status ON order_summaries WHEN OLD.status IS NOT NEW.status
+BEGIN{_aggregate_statements('OLD', '-', "OLD.status = 'completed'")}{_aggregate_statements('NEW', '+', "NEW.status = 'completed'")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_summaries_aggregate_total
+AFTER UPDATE OF total_price ON order_summaries
+WHEN OLD.status = 'completed' AND NEW.status = 'completed' AND OLD.total_price IS NOT NEW.total_price
+BEGIN{_aggregate_statements('OLD', '-', '1', medicines=False)}{_aggregate_statements('NEW', '+', '1', medicines=False)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS orders_aggregate_line
+AFTER INSERT ON orders WHEN NEW.status = 'completed' AND NEW.medicine_name IS NOT NULL
+BEGIN
+    INSERT INTO medicine_sales (medicine_name, units, revenue)
+    VALUES (NEW.medicine_name, NEW.quantity, NEW.total_price)
+    ON CONFLICT(medicine_name) DO UPDATE
+    SET units = units + excluded.units, revenue = revenue + excluded.revenue;
+END;
+"""
+
+# Catalog CSV column -> products table column
+PRODUCT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'price(₹)': 'price',
+    'manufacturer_name': 'manufacturer_name',
+    'type': 'type',
+    'pack_size_label': 'pack_size_label',
+    'short_composition1': 'short_composition1',
+    'short_composition2': 'short_composition2',
+    'Is_discontinued': 'is_discontinued',
+    'quantity': 'quantity',
+}
+
+ORDER_COLUMNS = [
+    'order_id', 'user_id', 'user_name', 'medicine_name', 'product_id',
+    'quantity', 'price_per_unit', 'total_price', 'order_date',
+    'status', 'delivery_address'
+]
+
+# An order's status is its newest event, or the status stored at checkout/compaction
+CURRENT_STATUS = (
+    "COALESCE((SELECT e.status FROM order_events e WHERE e.order_id = orders.order_id "
+    "ORDER BY e.id DESC LIMIT 1), orders.status)"
+)
+
+# Bump to rebuild order_summaries from the orders table on the next start
+SUMMARIES_VERSION = 2
+
+# Dashboard tabs
+ORDER_STATUSES = ['pending', 'completed', 'cancelled']
+
+# Statuses an order may move to from each status. Cancelling returns an
+# order's stock; a cancelled order is reopened as pending and takes it again
+ORDER_TRANSITIONS = {
+    'pending': ('completed', 'cancelled'),
+    'completed': ('pending', 'cancelled'),
+    'cancelled': ('pending',),
+}
+
+ORDER_SELECT = ', '.join(
+    f'{CURRENT_STATUS} AS status' if col == 'status' else col for col in ORDER_COLUMNS
+)
+
+# Appends (order lines and status events) between compactions
+COMPACT_EVERY = 1000
+
+# Order lines fetched per round trip when exporting
+EXPORT_BATCH_ROWS = 1000
+
+
+def _stock_levels(matched: pd.DataFrame, feed: pd.DataFrame) -> pd.DataFrame:
+    """New stock per product from feed rows matched to products (seq, id, name, old)"""
+    rows = matched.join(feed[['delta', 'quantity']], on='seq').sort_values('seq', kind='stable')
+    product = rows['id']
+    # The last absolute quantity per product wins; deltas from that row on add to it
+    last_absolute = rows['seq'].where(rows['quantity'].notna()).groupby(product).transform('max')
+    counts = last_absolute.isna() | (rows['seq'] >= last_absolute)
+    base = rows['quantity'].where(rows['seq'] == last_absolute).astype('float64').groupby(product).max()
+    deltas = rows['delta'].where(counts).astype('float64').fillna(0).groupby(product).sum()
+    levels = rows.groupby('id').agg(name=('name', 'first'), old=('old', 'first'))
+    levels['new'] = (base.fillna(levels['old']) + deltas).clip(lower=0).astype('int64')
+    levels = levels[levels['new'] != levels['old']].reset_index()
+    return levels[['id', 'name', 'old', 'new']]
+
+
+class OutOfStockError(Exception):
+    """Raised when an order asks for more units than are in stock"""
+
+    def __init__(self, name: str, available: int, product_id: Optional[int] = None):
+        super().__init__(f"Only {available} units of {name} in stock")
+        self.name = name
+        self.available = available
+        self.product_id = product_id
+
+
+class Storage:
+    """SQLite store for catalog stock and orders, shared by the bot and the admin.
+
+    Every thread gets its own connection. The database runs in WAL mode so the
+    admin can read while the bot writes, with every commit fsync'd.
+
+    Order history is append-only: checkout inserts line items and status
+    changes are appended to order_events. Every COMPACT_EVERY appends a
+    background compaction folds the events into the orders table,
+    checkpoints the WAL and, if `snapshot_path` is set, rewrites that CSV
+    snapshot of all orders.
+    """
+
+    def __init__(self, db_path: str, snapshot_path: Optional[str] = None):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self._local = threading.local()
+        self._compacting = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn.executescript(SCHEMA + AGGREGATE_TRIGGERS)
+        # Databases created before order lines recorded their product
+        columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(orders)')}
+        if 'product_id' not in columns:
+            self.conn.execute('ALTER TABLE orders ADD COLUMN product_id INTEGER')
+        if self._meta('summaries_version') != SUMMARIES_VERSION:
+            self.rebuild_order_summaries()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly below
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in one write transaction, taking the write lock up front"""
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # Catalog
+
+    def import_products(self, df: pd.DataFrame):
+        """Add catalog rows that are not stored yet; stock of known products is kept"""
+        columns = [col for col in PRODUCT_COLUMNS if col in df.columns]
+        # Plain Python values for sqlite3, with blanks and NaN stored as NULL
+        values = df[columns].astype(object)
+        values = values.where(values.notna() & (values != ''), None)
+        placeholders = ', '.join('?' for _ in columns)
+        names = ', '.join(PRODUCT_COLUMNS[col] for col in columns)
+        with self.transaction() as conn:
+            conn.executemany(
+                f'INSERT OR IGNORE INTO products ({names}) VALUES ({placeholders})',
+                values.itertuples(index=False, name=None)
+            )
+
+    def stock(self) -> pd.Series:
+        """Stored quantity for every product, indexed by product id"""
+        stock = pd.read_sql_query('SELECT id, quantity FROM products', self.conn)
+        return stock.set_index('id')['quantity']
+
+    def stock_version(self) -> int:
+        """Counter bumped by every stock change, from any process"""
+        return int(self._meta('stock_version', 0))
+
+    def stock_by_ids(self, product_ids: List[int]) -> Dict[int, int]:
+        """Stored quantity per product id; unknown ids are left out"""
+        rows = self.conn.execute(
+            'SELECT id, quantity FROM products WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(sorted({int(pid) for pid in product_ids})),)
+        )
+        return {row[0]: row[1] for row in rows}
+
+    # Orders
+
+    @CHECKOUT_SECONDS.time()
+    def place_order(self, items: List[Dict]) -> Tuple[Dict[int, int], int, int]:
+        """Record an order's line items and take their quantities out of stock.
+
+        Lines name their product by `product_id`. Stock is checked and
+        decremented under the database write lock, so concurrent checkouts
+        from any thread or process cannot oversell. Raises OutOfStockError,
+        recording nothing, if any line is short. Returns the new stock level
+        per product and the stock version just before and just after the order.
+        """
+        needed, names = defaultdict(int), {}
+        for item in items:
+            needed[int(item['product_id'])] += item['quantity']
+            names[int(item['product_id'])] = item['medicine_name']
+        with self.transaction() as conn:
+            before = self.stock_version()
+            stock = self.stock_by_ids(list(needed))
+            for product_id, quantity in needed.items():
+                available = stock.get(product_id, 0)
+                if available < quantity:
+                    raise OutOfStockError(names[product_id], available, product_id)
+            conn.executemany(
+                f'INSERT INTO orders ({", ".join(ORDER_COLUMNS)}) '
+                f'VALUES ({", ".join("?" for _ in ORDER_COLUMNS)})',
+                [tuple(item.get(col) for col in ORDER_COLUMNS) for item in items]
+            )
+            conn.executemany(
+                'UPDATE products SET quantity = quantity - ? WHERE id = ?',
+                [(quantity, product_id) for product_id, quantity in needed.items()]
+            )
+            after = self.stock_version()
+        self.maybe_compact()
+        return {product_id: stock[product_id] - quantity for product_id, quantity in needed.items()}, before, after
+
+    def apply_stock_feed(self, feed: pd.DataFrame) -> Tuple[pd.DataFrame, int, int, int]:
+        """Apply a chunk of a stock feed (see stock_feed.read_feed) in one transaction.
+
+        Rows are matched by id, or by name when they have no id, in which case
+        every product with that name is updated. Per product, the last absolute
+        quantity replaces the level and later deltas add to it; levels never go
+        below zero. Returns the changed products (id, name, old, new), the
+        number of feed rows matching no product, and the stock version just
+        before and after.
+        """
+        feed = feed.reset_index(drop=True)
+        keys = feed[['id', 'name']].astype(object).where(feed[['id', 'name']].notna(), None)
+        with self.transaction() as conn:
+            before = self.stock_version()
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS stock_feed (seq INTEGER PRIMARY KEY, id INTEGER, name TEXT)')
+            conn.execute('DELETE FROM stock_feed')
+            conn.executemany('INSERT INTO stock_feed (seq, id, name) VALUES (?, ?, ?)',
+                             zip(range(len(feed)), keys['id'], keys['name']))
+            matched = pd.read_sql_query(
+                'SELECT f.seq, p.id, p.name, p.quantity AS old FROM stock_feed f JOIN products p ON p.id = f.id '
+                'UNION ALL '
+                'SELECT f.seq, p.id, p.name, p.quantity FROM stock_feed f JOIN products p ON p.name = f.name '
+                'WHERE f.id IS NULL',
+                conn
+            )
+            unmatched = len(feed) - matched['seq'].nunique()
+            changes = _stock_levels(matched, feed)
+            conn.executemany('UPDATE products SET quantity = ? WHERE id = ?',
+                             zip(changes['new'].tolist(), changes['id'].tolist()))
+            after = self.stock_version()
+        return changes, unmatched, before, after
+
+    def update_statuses(self, changes: List[Tuple[str, str]]) -> Tuple[List[Dict], Dict[int, int], int, int]:
+        """Apply (order_id, status) changes in one transaction.
+
+        Each change is checked against ORDER_TRANSITIONS and the order's
+        current status; rejected ones are reported, not applied, and do not
+        stop the others. Cancelling puts the order's quantities back in stock
+        and reopening a cancelled order takes them out again, which is
+        rejected if they are no longer in stock. Stock moves by the product
+        each line was sold as; lines from before products were recorded fall
+        back to their medicine name only when exactly one product has it.
+        Returns a result per change (order_id, status, previous, error), the
+        new stock level of each product moved, and the stock version just
+        before and after.
+        """
+        order_ids = json.dumps(sorted({order_id for order_id, _ in changes}))
+        with self.transaction() as conn:
+            before = self.stock_version()
+            current = {row[0]: row[1] for row in conn.execute(
+                'SELECT order_id, status FROM order_summaries WHERE order_id IN (SELECT value FROM json_each(?))',
+                (order_ids,)
+            )}
+            # Units per product in each order, which cancelling returns to stock
+            lines = defaultdict(list)
+            for order_id, product_id, name, quantity in conn.execute(
+                    'SELECT o.order_id, coalesce(o.product_id, (SELECT min(p.id) FROM products p '
+                    '  WHERE p.name = o.medicine_name HAVING count(*) = 1)) AS pid, '
+                    'min(o.medicine_name), sum(o.quantity) FROM orders o '
+                    'WHERE o.order_id IN (SELECT value FROM json_each(?)) AND pid IS NOT NULL '
+                    'GROUP BY o.order_id, pid',
+                    (order_ids,)):
+                lines[order_id].append((product_id, name, quantity))
+            levels = self.stock_by_ids([line[0] for order_lines in lines.values() for line in order_lines])
+
+            results, events = [], []
+            stock = defaultdict(int)
+            for order_id, status in changes:
+                previous = current.get(order_id)
+                result = {'order_id': order_id, 'status': status, 'previous': previous, 'error': None}
+                results.append(result)
+                if previous is None:
+                    result['error'] = 'Order not found'
+                elif status not in ORDER_STATUSES:
+                    result['error'] = f"Unknown status '{status}'"
+                elif status == previous:
+                    result['error'] = f'Order is already {status}'
+                elif status not in ORDER_TRANSITIONS.get(previous, ORDER_STATUSES):
+                    result['error'] = f'A {previous} order cannot be marked {status}'
+                if result['error']:
+                    continue
+                sign = 1 if status == 'cancelled' else -1 if previous == 'cancelled' else 0
+                if sign < 0:
+                    for product_id, name, quantity in lines[order_id]:
+                        available = levels.get(product_id, 0) + stock[product_id]
+                        if available < quantity:
+                            result['error'] = str(OutOfStockError(name, available, product_id))
+                            break
+                    if result['error']:
+                        continue
+                if sign:
+                    for product_id, _, quantity in lines[order_id]:
+                        stock[product_id] += sign * quantity
+                current[order_id] = status
+                events.append((order_id, status))
+
+            created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            conn.executemany('INSERT INTO order_events (order_id, status, created_at) VALUES (?, ?, ?)',
+                             [(order_id, status, created_at) for order_id, status in events])
+            stock = {product_id: delta for product_id, delta in stock.items() if delta and product_id in levels}
+            conn.executemany('UPDATE products SET quantity = quantity + ? WHERE id = ?',
+                             [(delta, product_id) for product_id, delta in stock.items()])
+            after = self.stock_version()
+        self.maybe_compact()
+        return results, {product_id: levels[product_id] + delta for product_id, delta in stock.items()}, before, after
+
+    def order_items(self, order_id: str) -> List[Dict]:
+        rows = self.conn.execute(
+            f'SELECT {ORDER_SELECT} FROM orders WHERE order_id = ? ORDER BY id',
+            (order_id,)
+        )
+        return [dict(row) for row in rows]
+
+    # Bot sessions
+
+    def load_sessions(self, since: float) -> List[Tuple[int, str, float]]:
+        """(user_id, data, updated_at) of sessions active since `since`; older ones are deleted"""
+        self.expire_sessions(since)
+        rows = self.conn.execute(
+            'SELECT user_id, data, updated_at FROM sessions WHERE updated_at >= ?', (since,)
+        )
+        return [tuple(row) for row in rows]
+
+    def save_sessions(self, updates: List[Tuple[int, str, float]], drops: List[int] = ()):
+        """Write and delete a batch of sessions in one transaction"""
+        with self.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                updates
+            )
+            conn.executemany('DELETE FROM sessions WHERE user_id = ?', [(user_id,) for user_id in drops])
+
+    def expire_sessions(self, before: float) -> int:
+        """Delete sessions idle since before `before`; returns how many"""
+        with self.transaction() as conn:
+            return conn.execute('DELETE FROM sessions WHERE updated_at < ?', (before,)).rowcount
+
+    # Compaction
+
+    def _meta(self, key: str, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def pending_appends(self) -> int:
+        """Status events plus order lines written since the last compaction"""
+        snapshot_id = self._meta('snapshot_order_row', 0)
+        events = self.conn.execute('SELECT count(*) FROM order_events').fetchone()[0]
+        lines = self.conn.execute('SELECT count(*) FROM orders WHERE id > ?', (snapshot_id,)).fetchone()[0]
+        return events + lines
+
+    def maybe_compact(self):
+        """Start a background compaction once enough appends have piled up"""
+        if self.pending_appends() < COMPACT_EVERY or self._compacting.locked():
+            return
+        threading.Thread(target=self.compact, name='OrderCompaction', daemon=True).start()
+
+    @COMPACTION_SECONDS.time()
+    def compact(self):
+        """Fold status events into orders, checkpoint the WAL and refresh the snapshot"""
+        if not self._compacting.acquire(blocking=False):
+            return
+        try:
+            with self.transaction() as conn:
+                last_event = conn.execute('SELECT max(id) FROM order_events').fetchone()[0]
+                if last_event is not None:
+                    conn.execute(
+                        'UPDATE orders SET status = (SELECT e.status FROM order_events e '
+                        'WHERE e.order_id = orders.order_id AND e.id <= ? ORDER BY e.id DESC LIMIT 1) '
+                        'WHERE order_id IN (SELECT order_id FROM order_events WHERE id <= ?)',
+                        (last_event, last_event)
+                    )
+                    conn.execute('DELETE FROM order_events WHERE id <= ?', (last_event,))
+                last_line = conn.execute('SELECT coalesce(max(id), 0) FROM orders').fetchone()[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_order_row', ?)",
+                    (last_line,)
+                )
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            if self.snapshot_path:
+                self.write_snapshot(self.snapshot_path)
+        finally:
+            self._compacting.release()
+
+    def write_snapshot(self, path: str):
+        """Write all orders to a CSV atomically, streaming rows from the database"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.orders-', suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(ORDER_COLUMNS)
+                cursor = self.conn.execute(f'SELECT {ORDER_SELECT} FROM orders ORDER BY id')
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def customer_names(self, search: str = '') -> List[str]:
+        """Distinct customer names containing `search` (case-insensitive)"""
+        rows = self.conn.execute(
+            'SELECT user_name FROM customers WHERE instr(lower(user_name), ?) > 0',
+            (search.lower(),)
+        )
+        return [row[0] for row in rows]
+
+    def last_customer_rowid(self) -> int:
+        return self.conn.execute('SELECT coalesce(max(rowid), 0) FROM customers').fetchone()[0]
+
+    def customers_since(self, rowid: int) -> List[Tuple[int, str]]:
+        """Customers added after `rowid`, oldest first"""
+        rows = self.conn.execute(
+            'SELECT rowid, user_name FROM customers WHERE rowid > ? ORDER BY rowid', (rowid,)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    # Dashboard
+
+    def rebuild_order_summaries(self):
+        """Recompute order_summaries, the per-status totals and the report
+        aggregates from the order lines"""
+        with self.transaction() as conn:
+            for table in ('order_summaries', 'order_status_totals', 'customers',
+                          'revenue_rollups', 'customer_spend', 'medicine_sales'):
+                conn.execute(f'DELETE FROM {table}')
+            # The insert triggers fill in everything but the medicine sales
+            conn.execute(
+                'INSERT INTO order_summaries '
+                '(order_id, user_name, order_time, order_day, total_price, status, delivery_address) '
+                'SELECT o.order_id, o.user_name, datetime(o.order_date), date(o.order_date), t.total, '
+                f'{CURRENT_STATUS.replace("orders.", "o.")}, o.delivery_address '
+                'FROM (SELECT order_id, min(id) AS first_id, sum(total_price) AS total '
+                '      FROM orders GROUP BY order_id) t '
+                'JOIN orders o ON o.id = t.first_id'
+            )
+            conn.execute(
+                'INSERT INTO medicine_sales (medicine_name, units, revenue) '
+                'SELECT o.medicine_name, sum(o.quantity), sum(o.total_price) '
+                'FROM orders o JOIN order_summaries s ON s.order_id = o.order_id '
+                "WHERE s.status = 'completed' AND o.medicine_name IS NOT NULL "
+                'GROUP BY o.medicine_name'
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('summaries_version', ?)",
+                (SUMMARIES_VERSION,)
+            )
+
+    @staticmethod
+    def _summary_filter(day: Optional[str], name: Optional[str],
+                        since: Optional[str] = None, until: Optional[str] = None):
+        """WHERE clause (after the status condition) and its parameters"""
+        clauses, params = ['order_time IS NOT NULL'], []
+        if day:
+            clauses.append('order_day = ?')
+            params.append(day)
+        if since:
+            clauses.append('order_day >= ?')
+            params.append(since)
+        if until:
+            clauses.append('order_day <= ?')
+            params.append(until)
+        if name:
+            # Few customers compared to orders: match their names, then use the index
+            clauses.append('user_name IN (SELECT user_name FROM customers '
+                           'WHERE instr(lower(user_name), ?) > 0)')
+            params.append(name.lower())
+        return ' AND '.join(clauses), params
+
+    def order_page(self, status: str, offset: int = 0, limit: int = 50,
+                   day: Optional[str] = None, name: Optional[str] = None) -> List[Dict]:
+        """One page of order summaries with `status`, newest first.
+
+        `day` is a YYYY-MM-DD date; `name` matches part of the customer name.
+        Orders whose date cannot be parsed are not listed.
+        """
+        where, params = self._summary_filter(day, name)
+        rows = self.conn.execute(
+            'SELECT order_id, user_name, order_time AS order_date, total_price, status, delivery_address '
+            f'FROM order_summaries WHERE status = ? AND {where} '
+            'ORDER BY order_time DESC LIMIT ? OFFSET ?',
+            [status] + params + [limit, max(0, offset)]
+        )
+        return [dict(row) for row in rows]
+
+    def order_totals(self, day: Optional[str] = None, name: Optional[str] = None) -> Dict[str, Dict]:
+        """Number of orders and their revenue per status.
+
+        Without filters this reads the running totals, so it costs the same
+        however many orders there are.
+        """
+        totals = {status: {'orders': 0, 'revenue': 0.0} for status in ORDER_STATUSES}
+        if day or name:
+            where, params = self._summary_filter(day, name)
+            rows = self.conn.execute(
+                'SELECT status, count(*) AS orders, coalesce(sum(total_price), 0) AS revenue '
+                f'FROM order_summaries WHERE status IN ({", ".join("?" for _ in ORDER_STATUSES)}) '
+                f'AND {where} GROUP BY status',
+                ORDER_STATUSES + params
+            )
+        else:
+            rows = self.conn.execute('SELECT status, orders, revenue FROM order_status_totals')
+        for row in rows:
+            totals[row['status']] = {'orders': row['orders'], 'revenue': row['revenue']}
+        return totals
+
+    def order_line_batches(self, status: Optional[str] = None, day: Optional[str] = None,
+                           since: Optional[str] = None, until: Optional[str] = None,
+                           name: Optional[str] = None,
+                           batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[List[Tuple]]:
+        """Order lines matching the dashboard filters, oldest order first, as
+        lists of at most `batch_rows` tuples in ORDER_COLUMNS order.
+
+        `since` and `until` bound the order day, both inclusive. The lines are
+        read from one snapshot on a connection of their own, closed when the
+        generator is, so a long export holds one batch in memory and leaves
+        the thread's connection free.
+        """
+        where, params = self._summary_filter(day, name, since, until)
+        statuses = [status] if status else ORDER_STATUSES
+        columns = ', '.join('s.status' if col == 'status' else f'o.{col}' for col in ORDER_COLUMNS)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA query_only=1')
+            cursor = conn.execute(
+                f'SELECT {columns} FROM orders o JOIN '
+                '(SELECT order_id, status, order_time FROM order_summaries '
+                f'WHERE status IN ({", ".join("?" for _ in statuses)}) AND {where}) s '
+                'ON s.order_id = o.order_id ORDER BY s.order_time, o.id',
+                statuses + params
+            )
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    # Reports
+
+    def revenue_rollup(self, period: str = 'day', limit: int = 30) -> List[Dict]:
+        """Completed orders and revenue for the latest `limit` days, weeks or months"""
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(ROLLUP_PERIODS)}")
+        rows = self.conn.execute(
+            'SELECT bucket, orders, revenue FROM revenue_rollups WHERE period = ? AND orders > 0 '
+            'ORDER BY bucket DESC LIMIT ?',
+            (period, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def top_medicines(self, limit: int = 20) -> List[Dict]:
+        """Medicines with the most units sold in completed orders"""
+        rows = self.conn.execute(
+            'SELECT medicine_name, units, revenue FROM medicine_sales '
+            'WHERE units > 0 ORDER BY units DESC LIMIT ?',
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def top_customers(self, limit: int = 20) -> List[Dict]:
+        """Customers who spent the most on completed orders"""
+        rows = self.conn.execute(
+            'SELECT user_name, orders, revenue FROM customer_spend '
+            'WHERE orders > 0 ORDER BY revenue DESC LIMIT ?',
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def import_orders_csv(self, orders_path: str) -> int:
+        """One-shot import of orders.csv; does nothing once orders exist"""
+        if not os.path.exists(orders_path):
+            return 0
+        orders_df = pd.read_csv(orders_path)
+        orders_df = orders_df[orders_df['order_id'].notna()]
+        for col in ORDER_COLUMNS:
+            if col not in orders_df.columns:
+                orders_df[col] = None
+        orders_df['status'] = orders_df['status'].fillna('pending')
+        orders_df = orders_df[ORDER_COLUMNS].astype(object).where(orders_df[ORDER_COLUMNS].notna(), None)
+
+        with self.transaction() as conn:
+            if conn.execute('SELECT 1 FROM orders LIMIT 1').fetchone():
+                return 0
+            conn.executemany(
+                f'INSERT INTO orders ({", ".join(ORDER_COLUMNS)}) '
+                f'VALUES ({", ".join("?" for _ in ORDER_COLUMNS)})',
+                orders_df.itertuples(index=False, name=None)
+            )
+            # The imported file already is a snapshot of these lines
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "VALUES ('snapshot_order_row', (SELECT max(id) FROM orders))"
+            )
+        return len(orders_df)
+
+
+def import_csvs(db_path: str, catalog_path: Optional[str], orders_path: Optional[str]):
+    """Load the existing catalog and orders CSVs into a new database"""
+    from product_db import ProductDB
+
+    storage = Storage(db_path)
+    if catalog_path:
+        product_db = ProductDB(catalog_path, storage=storage)
+        print(f"Imported {len(product_db.df)} products")
+    if orders_path:
+        print(f"Imported {storage.import_orders_csv(orders_path)} order lines")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import the catalog and orders CSVs into SQLite')
+    parser.add_argument('db_path', help='Path to the SQLite database')
+    parser.add_argument('--catalog', help='Path to the medicines CSV')
+    parser.add_argument('--orders', help='Path to orders.csv')
+
+    args = parser.parse_args()
+    import_csvs(args.db_path, args.catalog, args.orders)
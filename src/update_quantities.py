@@ -1,28 +1,76 @@
-import pandas as pd
-import random
-import argparse
-
-def update_quantities(file_path: str, min_qty: int = 0, max_qty: int = 25):
-    """Update quantities in the CSV file with random values"""
-    try:
-        # Read the CSV file
-        df = pd.read_csv(file_path)
-        
-        # Generate random quantities
-        df['quantity'] = [random.randint(min_qty, max_qty) for _ in range(len(df))]
-        
-        # Save back to CSV
-        df.to_csv(file_path, index=False)
-        print(f"Successfully updated quantities for {len(df)} products")
-        
-    except Exception as e:
-        print(f"Error updating quantities: {str(e)}")
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Update product quantities with random values')
-    parser.add_argument('file_path', help='Path to the CSV file')
-    parser.add_argument('--min', type=int, default=0, help='Minimum quantity (default: 0)')
-    parser.add_argument('--max', type=int, default=25, help='Maximum quantity (default: 25)')
-    
-    args = parser.parse_args()
-    update_quantities(args.file_path, args.min, args.max) 
\ No newline at end of file
+import numpy as np
+import pandas as pd
+import argparse
+from typing import Optional
+from storage import Storage
+from stock_feed import apply_feed, FEED_MODES, FEED_CHUNK_ROWS
+
+def update_quantities(file_path: str, min_qty: int = 0, max_qty: int = 25, db_path: Optional[str] = None):
+    """Set every product's quantity to a random value, for testing.
+
+    With a database the levels are stored there, where the bot takes stock
+    from, through the same batched path as supplier feeds; the catalog CSV is
+    left alone. Without one the CSV's quantity column is rewritten.
+    """
+    try:
+        rng = np.random.default_rng()
+        if db_path:
+            storage = Storage(db_path)
+            ids = pd.read_sql_query('SELECT id FROM products', storage.conn)['id']
+            feed = pd.DataFrame({'id': ids, 'quantity': rng.integers(min_qty, max_qty + 1, size=len(ids))})
+            summary = apply_feed(feed, storage)
+            print(f"Successfully updated quantities for {summary['changed']} of {len(ids)} products")
+            return
+
+        # Read the CSV file
+        df = pd.read_csv(file_path)
+
+        # Generate random quantities
+        df['quantity'] = rng.integers(min_qty, max_qty + 1, size=len(df))
+
+        # Save back to CSV
+        df.to_csv(file_path, index=False)
+        print(f"Successfully updated quantities for {len(df)} products")
+
+    except Exception as e:
+        print(f"Error updating quantities: {str(e)}")
+
+def sync_stock_feed(feed_path: str, db_path: str, mode: str = 'delta', fmt: Optional[str] = None,
+                    changes_path: Optional[str] = None, chunk_rows: int = FEED_CHUNK_ROWS):
+    """Apply a supplier stock feed to the database and report what changed"""
+    try:
+        summary = apply_feed(feed_path, Storage(db_path), fmt=fmt, mode=mode, chunk_rows=chunk_rows)
+        print(f"Applied {summary['rows']} feed rows in {summary['seconds']}s: "
+              f"{summary['changed']} products changed, {summary['unmatched']} rows matched no product, "
+              f"{summary['invalid']} rows invalid")
+        if changes_path:
+            summary['changes'].to_csv(changes_path, index=False)
+            print(f"Changed products written to {changes_path}")
+    except Exception as e:
+        print(f"Error applying stock feed: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Apply a supplier stock feed, or set product quantities to random values for testing'
+    )
+    parser.add_argument('file_path', nargs='?', help='Catalog CSV to randomize when no database is given')
+    parser.add_argument('--min', type=int, default=0, help='Minimum quantity (default: 0)')
+    parser.add_argument('--max', type=int, default=25, help='Maximum quantity (default: 25)')
+    parser.add_argument('--db', help='SQLite database holding stock (e.g. data/medisearch.db)')
+    parser.add_argument('--feed', help='Supplier feed (CSV, JSON or NDJSON) of id/name with delta/quantity/qty')
+    parser.add_argument('--mode', choices=FEED_MODES, default='delta',
+                        help='How a bare qty/value column is read (default: delta)')
+    parser.add_argument('--format', choices=['csv', 'json', 'ndjson'], help='Feed format (default: from extension)')
+    parser.add_argument('--changes', help='Write the changed products (id, name, old, new) to this CSV')
+    parser.add_argument('--chunk-rows', type=int, default=FEED_CHUNK_ROWS,
+                        help=f'Feed rows per transaction (default: {FEED_CHUNK_ROWS})')
+
+    args = parser.parse_args()
+    if args.feed:
+        if not args.db:
+            parser.error('--feed needs --db')
+        sync_stock_feed(args.feed, args.db, args.mode, args.format, args.changes, args.chunk_rows)
+    elif args.file_path or args.db:
+        update_quantities(args.file_path, args.min, args.max, args.db)
+    else:
+        parser.error('give a catalog CSV, --db, or --feed with --db')
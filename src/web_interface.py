@@ -1,191 +1,457 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-import pandas as pd
-import os
-from datetime import datetime
-import csv
-from dotenv import load_dotenv
-import sys
-import logging
-
-# Update the template directory setup
-if getattr(sys, 'frozen', False):
-    # If the application is run as a bundle (PyInstaller)
-    template_dir = os.path.join(sys._MEIPASS, 'templates')
-else:
-    # If the application is run from Python interpreter
-    template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
-
-app = Flask(__name__, template_folder=template_dir)
-app.secret_key = 'your_secret_key_here'  # Required for flash messages
-
-# Load environment variables
-load_dotenv()
-
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
-def get_base_path():
-    """Get the base path for the application, works both in dev and packaged mode"""
-    if getattr(sys, 'frozen', False):
-        # If the application is run as a bundle, use the parent directory of the executable
-        return os.path.dirname(os.path.dirname(sys.executable))
-    else:
-        # If the application is run from Python interpreter
-        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-def get_data_path():
-    """Get the data directory path"""
-    base = get_base_path()
-    data_path = os.path.join(base, 'data')
-    
-    # Create data directory if it doesn't exist
-    os.makedirs(data_path, exist_ok=True)
-    
-    logger.debug(f"Data directory path: {data_path}")
-    return data_path
-
-# Update paths
-base_path = get_base_path()
-data_path = get_data_path()
-orders_path = os.path.join(data_path, 'orders.csv')
-
-logger.debug(f"Base path: {base_path}")
-logger.debug(f"Orders path: {orders_path}")
-logger.debug(f"Orders file exists: {os.path.exists(orders_path)}")
-
-def create_orders_csv():
-    """Create orders.csv if it doesn't exist"""
-    if not os.path.exists(orders_path):
-        os.makedirs(os.path.dirname(orders_path), exist_ok=True)
-        with open(orders_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'order_id', 'user_id', 'user_name', 'medicine_name', 
-                'quantity', 'price_per_unit', 'total_price', 'order_date', 
-                'status', 'delivery_address'
-            ])
-
-# Create orders.csv if it doesn't exist
-create_orders_csv()
-
-@app.route('/')
-def index():
-    return redirect(url_for('orders'))
-
-@app.route('/get_customers')
-def get_customers():
-    """API endpoint to get customer names for autocomplete"""
-    try:
-        search = request.args.get('term', '').lower()
-        orders_df = pd.read_csv(orders_path)
-        customers = orders_df['user_name'].dropna().unique()
-        
-        # Filter customers based on search term
-        filtered_customers = [
-            name for name in customers 
-            if search in name.lower()
-        ]
-        
-        return jsonify(filtered_customers)
-    except Exception as e:
-        return jsonify([])
-
-@app.route('/orders')
-def orders():
-    try:
-        # Get filter parameters from URL
-        filter_date = request.args.get('date')
-        filter_name = request.args.get('name', '').lower()
-        
-        orders_df = pd.read_csv(orders_path)
-        # Clean any NaN values and remove invalid rows
-        orders_df = orders_df[orders_df['order_id'].notna()]
-        orders_df['status'] = orders_df['status'].fillna('pending')
-        
-        # Convert order_date to datetime safely
-        def safe_datetime(x):
-            try:
-                return pd.to_datetime(x)
-            except:
-                return pd.NaT  # Not a Time value for invalid dates
-        
-        orders_df['order_date'] = orders_df['order_date'].apply(safe_datetime)
-        
-        # Apply filters
-        if filter_date and filter_date.strip():  # Check if date filter is not empty
-            try:
-                filter_date = pd.to_datetime(filter_date).date()
-                orders_df = orders_df[orders_df['order_date'].dt.date == filter_date]
-            except:
-                flash('Invalid date format')
-        
-        if filter_name:
-            orders_df = orders_df[orders_df['user_name'].str.lower().str.contains(filter_name)]
-        
-        # Calculate total profit from completed orders
-        completed_orders = orders_df[orders_df['status'] == 'completed']
-        total_profit = completed_orders['total_price'].sum()
-        
-        # Group by order_id to get order summaries
-        order_groups = orders_df.groupby('order_id').agg({
-            'user_name': 'first',
-            'order_date': 'first',
-            'total_price': 'sum',
-            'status': 'first',
-            'delivery_address': 'first'
-        }).reset_index()
-        
-        # Remove rows with invalid dates
-        order_groups = order_groups.dropna(subset=['order_date'])
-        
-        # Sort by date (newest first)
-        order_groups = order_groups.sort_values('order_date', ascending=False)
-        
-        orders_by_status = {
-            'pending': order_groups[order_groups['status'] == 'pending'].to_dict('records'),
-            'completed': order_groups[order_groups['status'] == 'completed'].to_dict('records'),
-            'cancelled': order_groups[order_groups['status'] == 'cancelled'].to_dict('records')
-        }
-        
-        return render_template('orders.html', 
-                             orders_by_status=orders_by_status,
-                             total_profit=total_profit,
-                             filter_date=filter_date,
-                             filter_name=filter_name)
-    except Exception as e:
-        logger.error(f"Error in orders route: {str(e)}", exc_info=True)
-        flash(f'Error loading orders: {str(e)}')
-        return render_template('orders.html', 
-                             orders_by_status={'pending': [], 'completed': [], 'cancelled': []},
-                             total_profit=0,
-                             filter_date=None,
-                             filter_name='')
-
-@app.route('/order/<order_id>')
-def order_detail(order_id):
-    try:
-        orders_df = pd.read_csv(orders_path)
-        order_items = orders_df[orders_df['order_id'] == order_id].to_dict('records')
-        if not order_items:
-            flash('Order not found')
-            return redirect(url_for('orders'))
-            
-        return render_template('order_detail.html', 
-                             items=order_items, 
-                             order_id=order_id,
-                             delivery_address=order_items[0].get('delivery_address', ''))
-    except Exception as e:
-        flash(f'Error loading order details: {str(e)}')
-        return redirect(url_for('orders'))
-
-@app.route('/update_status/<order_id>', methods=['POST'])
-def update_status(order_id):
-    new_status = request.form.get('status')
-    orders_df = pd.read_csv(orders_path)
-    orders_df.loc[orders_df['order_id'] == order_id, 'status'] = new_status
-    orders_df.to_csv(orders_path, index=False)
-    flash(f'Order {order_id} status updated to {new_status}')
-    return redirect(url_for('orders'))
-
-if __name__ == '__main__':
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, Response
+import pandas as pd
+import os
+from datetime import datetime
+import csv
+import io
+import json
+from dotenv import load_dotenv
+import sys
+import logging
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse, urlunparse
+from storage import Storage, ORDER_STATUSES, ORDER_COLUMNS, ORDER_TRANSITIONS
+from customer_index import CustomerIndex
+from product_db import ProductDB
+from stock_feed import apply_feed, feed_format
+from metrics import REGISTRY, PROFILER, CONTENT_TYPE, HTTP_SECONDS
+
+# Update the template directory setup
+if getattr(sys, 'frozen', False):
+    # If the application is run as a bundle (PyInstaller)
+    template_dir = os.path.join(sys._MEIPASS, 'templates')
+else:
+    # If the application is run from Python interpreter
+    template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+app = Flask(__name__, template_folder=template_dir)
+app.secret_key = 'your_secret_key_here'  # Required for flash messages
+
+# Load environment variables
+load_dotenv()
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def get_base_path():
+    """Get the base path for the application, works both in dev and packaged mode"""
+    if getattr(sys, 'frozen', False):
+        # If the application is run as a bundle, use the parent directory of the executable
+        return os.path.dirname(os.path.dirname(sys.executable))
+    else:
+        # If the application is run from Python interpreter
+        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_data_path():
+    """Get the data directory path"""
+    base = get_base_path()
+    data_path = os.path.join(base, 'data')
+    
+    # Create data directory if it doesn't exist
+    os.makedirs(data_path, exist_ok=True)
+    
+    logger.debug(f"Data directory path: {data_path}")
+    return data_path
+
+# Update paths
+base_path = get_base_path()
+data_path = get_data_path()
+orders_path = os.path.join(data_path, 'orders.csv')
+
+logger.debug(f"Base path: {base_path}")
+logger.debug(f"Orders path: {orders_path}")
+logger.debug(f"Orders file exists: {os.path.exists(orders_path)}")
+
+def create_orders_csv():
+    """Create orders.csv if it doesn't exist"""
+    if not os.path.exists(orders_path):
+        os.makedirs(os.path.dirname(orders_path), exist_ok=True)
+        with open(orders_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                'order_id', 'user_id', 'user_name', 'medicine_name', 'product_id',
+                'quantity', 'price_per_unit', 'total_price', 'order_date', 
+                'status', 'delivery_address'
+            ])
+
+# Create orders.csv if it doesn't exist
+create_orders_csv()
+
+# Orders live in the database shared with the bot; orders.csv is imported once,
+# then kept as a compacted snapshot
+db_path = os.path.join(data_path, os.getenv('database_path', 'medisearch.db'))
+storage = Storage(db_path, snapshot_path=orders_path)
+storage.import_orders_csv(orders_path)
+customer_index = CustomerIndex(storage)
+
+# Catalog behind /search, loaded on first use. main.py hands over the bot's
+# instance so the bot and the admin share one copy and one search cache.
+product_db: Optional[ProductDB] = None
+_product_db_lock = threading.Lock()
+
+def get_product_db() -> ProductDB:
+    global product_db
+    with _product_db_lock:
+        if product_db is None:
+            csv_path = os.path.join(data_path, os.getenv('dataset_path', 'medicines.csv'))
+            shared = os.getenv('shared_catalog', '').lower() in ('1', 'true', 'yes')
+            product_db = ProductDB(csv_path, storage=storage, compact=True, shared=shared)
+        return product_db
+
+# Orders listed per page in each dashboard tab
+ORDERS_PAGE_SIZE = 50
+
+# Autocomplete suggestions per request, and how long browsers may reuse them
+CUSTOMER_RESULTS = 10
+CUSTOMER_CACHE_SECONDS = 30
+
+# Default and largest page size of /search
+SEARCH_RESULTS = 10
+MAX_SEARCH_RESULTS = 100
+
+# Changed products listed in a /stock_feed response; the counts cover all of them
+FEED_CHANGES_SHOWN = 1000
+
+# Rows per table on the reports page and default and largest limit of the report endpoints
+REPORT_ROWS = 30
+MAX_REPORT_ROWS = 1000
+
+# Order export formats and their content types
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or 'unmatched',
+                             method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Latency histograms and counters for the bot and admin, in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/metrics/profile')
+def metrics_profile():
+    """Hottest functions from the calls sampled by profile_sample_rate"""
+    return Response(PROFILER.report(), content_type='text/plain; charset=utf-8')
+
+@app.route('/')
+def index():
+    return redirect(url_for('orders'))
+
+@app.route('/get_customers')
+def get_customers():
+    """API endpoint to get customer names for autocomplete"""
+    try:
+        search = request.args.get('term', '').lower()
+        limit = min(max(1, request.args.get('limit', CUSTOMER_RESULTS, type=int)), 100)
+        
+        # Filter customers based on search term
+        filtered_customers = customer_index.search(search, limit=limit)
+        
+        response = jsonify(filtered_customers)
+        # Retyping or backspacing to an earlier term is answered by the browser
+        response.headers['Cache-Control'] = f'private, max-age={CUSTOMER_CACHE_SECONDS}'
+        return response
+    except Exception as e:
+        logger.error(f"Error in get_customers: {str(e)}")
+        return jsonify([])
+
+@app.route('/search')
+def search():
+    """Catalog search as JSON: ?q=dolo&offset=0&limit=10, all=1 to include out-of-stock"""
+    query = request.args.get('q', '')
+    limit = min(max(1, request.args.get('limit', SEARCH_RESULTS, type=int)), MAX_SEARCH_RESULTS)
+    offset = request.args.get('offset', 0, type=int)
+    in_stock_only = request.args.get('all', '').lower() not in ('1', 'true', 'yes')
+    return jsonify(get_product_db().search_page(query, offset=offset, limit=limit,
+                                                in_stock_only=in_stock_only))
+
+@app.route('/search/cache')
+def search_cache():
+    """Hit, miss and eviction counts of the search cache shared with the bot"""
+    return jsonify(get_product_db().cache_stats())
+
+@app.route('/stock_feed', methods=['POST'])
+def stock_feed():
+    """Apply a supplier stock feed to the live catalog without a reload.
+
+    Send the feed as a `feed` file upload or as the request body, with
+    ?mode=delta|absolute for a bare qty column and ?format=csv|json|ndjson
+    when it cannot be told from the file name.
+    """
+    mode = request.args.get('mode', 'delta')
+    fmt = request.args.get('format')
+    upload = request.files.get('feed')
+    if upload is not None:
+        source, fmt = upload.stream, feed_format(upload.filename or '', fmt)
+    else:
+        source = request.stream
+        fmt = fmt or ('json' if request.mimetype == 'application/json' else
+                      'ndjson' if request.mimetype == 'application/x-ndjson' else 'csv')
+    try:
+        summary = apply_feed(source, storage, product_db=get_product_db(), fmt=fmt, mode=mode)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    changes = summary.pop('changes')
+    summary['changes'] = changes.head(FEED_CHANGES_SHOWN).to_dict(orient='records')
+    logger.info(f"Stock feed applied: {summary['changed']} products changed in {summary['seconds']}s")
+    return jsonify(summary)
+
+def orders_page_url(status: str, page: int) -> str:
+    """Dashboard URL with one tab moved to `page`, keeping filters and other tabs"""
+    args = request.args.to_dict()
+    args[f'{status}_page'] = page
+    return url_for('orders', **args)
+
+@app.route('/orders')
+def orders():
+    try:
+        # Get filter parameters from URL
+        filter_date = request.args.get('date')
+        filter_name = request.args.get('name', '').lower()
+        
+        day = None
+        if filter_date and filter_date.strip():  # Check if date filter is not empty
+            try:
+                day = pd.to_datetime(filter_date).date().isoformat()
+            except:
+                flash('Invalid date format')
+        
+        # Each tab is paged on its own: ?pending_page=2&completed_page=1 ...
+        pages = {status: max(1, request.args.get(f'{status}_page', 1, type=int)) for status in ORDER_STATUSES}
+        totals = storage.order_totals(day=day, name=filter_name)
+        orders_by_status = {
+            status: storage.order_page(status, offset=(pages[status] - 1) * ORDERS_PAGE_SIZE,
+                                       limit=ORDERS_PAGE_SIZE, day=day, name=filter_name)
+            for status in ORDER_STATUSES
+        }
+        page_counts = {status: max(1, -(-totals[status]['orders'] // ORDERS_PAGE_SIZE))
+                       for status in ORDER_STATUSES}
+        
+        return render_template('orders.html', 
+                             orders_by_status=orders_by_status,
+                             order_counts={status: totals[status]['orders'] for status in ORDER_STATUSES},
+                             pages=pages,
+                             page_counts=page_counts,
+                             page_url=orders_page_url,
+                             transitions=ORDER_TRANSITIONS,
+                             total_profit=totals['completed']['revenue'],
+                             filter_date=day,
+                             filter_name=filter_name)
+    except Exception as e:
+        logger.error(f"Error in orders route: {str(e)}", exc_info=True)
+        flash(f'Error loading orders: {str(e)}')
+        return render_template('orders.html', 
+                             orders_by_status={'pending': [], 'completed': [], 'cancelled': []},
+                             order_counts={'pending': 0, 'completed': 0, 'cancelled': 0},
+                             pages={'pending': 1, 'completed': 1, 'cancelled': 1},
+                             page_counts={'pending': 1, 'completed': 1, 'cancelled': 1},
+                             page_url=orders_page_url,
+                             transitions=ORDER_TRANSITIONS,
+                             total_profit=0,
+                             filter_date=None,
+                             filter_name='')
+
+def export_day(param: str) -> Optional[str]:
+    """A date query parameter as YYYY-MM-DD; raises ValueError if it does not parse"""
+    value = request.args.get(param, '').strip()
+    if not value:
+        return None
+    try:
+        return pd.to_datetime(value).date().isoformat()
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid {param} date '{value}'")
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(ORDER_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+
+@app.route('/orders/export.<fmt>')
+def export_orders(fmt):
+    """Stream order lines as CSV or NDJSON: ?date= or ?from=&to=, &status=, &name=
+
+    Rows go out as they are read from the database, so an export of any
+    size runs in constant memory.
+    """
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown export format '{fmt}'; use csv or ndjson"}), 404
+    status = request.args.get('status', '').lower()
+    if status in ('', 'all'):
+        status = None
+    elif status not in ORDER_STATUSES:
+        return jsonify({'error': f"Unknown status '{status}'"}), 400
+    try:
+        day, since, until = export_day('date'), export_day('from'), export_day('to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    batches = storage.order_line_batches(status=status, day=day, since=since, until=until,
+                                         name=request.args.get('name', '').lower())
+    chunks = csv_chunks(batches) if fmt == 'csv' else ndjson_chunks(batches)
+    label = '-'.join(part for part in ('orders', status, day or since, until) if part)
+    return Response(chunks, content_type=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={label}.{fmt}'})
+
+@app.route('/reports')
+def reports():
+    period = request.args.get('period', 'day')
+    try:
+        revenue = storage.revenue_rollup(period, limit=REPORT_ROWS)
+    except ValueError as e:
+        flash(str(e))
+        period, revenue = 'day', storage.revenue_rollup('day', limit=REPORT_ROWS)
+    return render_template('reports.html',
+                         period=period,
+                         revenue=revenue,
+                         medicines=storage.top_medicines(REPORT_ROWS),
+                         customers=storage.top_customers(REPORT_ROWS),
+                         totals=storage.order_totals())
+
+def report_limit() -> int:
+    """?limit= of a report endpoint, kept between 1 and MAX_REPORT_ROWS"""
+    return min(max(1, request.args.get('limit', REPORT_ROWS, type=int)), MAX_REPORT_ROWS)
+
+@app.route('/reports/revenue')
+def revenue_report():
+    """Completed revenue per day, week or month: ?period=week&limit=12"""
+    try:
+        return jsonify(storage.revenue_rollup(request.args.get('period', 'day'), limit=report_limit()))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/reports/medicines')
+def medicines_report():
+    """Best-selling medicines by units in completed orders"""
+    return jsonify(storage.top_medicines(report_limit()))
+
+@app.route('/reports/customers')
+def customers_report():
+    """Customers by spend on completed orders"""
+    return jsonify(storage.top_customers(report_limit()))
+
+@app.route('/order/<order_id>')
+def order_detail(order_id):
+    try:
+        order_items = storage.order_items(order_id)
+        if not order_items:
+            flash('Order not found')
+            return redirect(url_for('orders'))
+            
+        return render_template('order_detail.html', 
+                             items=order_items, 
+                             order_id=order_id,
+                             delivery_address=order_items[0].get('delivery_address', ''))
+    except Exception as e:
+        flash(f'Error loading order details: {str(e)}')
+        return redirect(url_for('orders'))
+
+def change_statuses(changes):
+    """Apply (order_id, status) changes in one transaction.
+
+    A loaded catalog gets the stock that cancellations return patched in
+    place; otherwise the database alone is updated and catalogs elsewhere
+    pick it up from the stock version.
+    """
+    if product_db is not None:
+        return product_db.update_order_statuses(changes)
+    return storage.update_statuses(changes)[0]
+
+def back_to_orders():
+    """Redirect to the dashboard page the form was posted from, keeping its filters.
+
+    Only a referrer that is the dashboard on this host is followed, and
+    only its query string is kept.
+    """
+    orders_url = url_for('orders')
+    referrer = urlparse(request.referrer or '')
+    if referrer.netloc == request.host and referrer.path == orders_url:
+        return redirect(urlunparse(('', '', orders_url, '', referrer.query, '')))
+    return redirect(orders_url)
+
+@app.route('/update_status/<order_id>', methods=['POST'])
+def update_status(order_id):
+    new_status = request.form.get('status')
+    result = change_statuses([(order_id, new_status)])[0]
+    if result['error']:
+        flash(f"Order {order_id} not updated: {result['error']}")
+    else:
+        flash(f'Order {order_id} status updated to {new_status}')
+    return redirect(url_for('orders'))
+
+def json_status_changes(data):
+    """(order_id, status) pairs from a bulk_status JSON body; raises ValueError if it is malformed"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    if 'changes' in data:
+        changes = data['changes']
+        if not isinstance(changes, list) or not all(
+                isinstance(change, dict) and isinstance(change.get('order_id'), str)
+                and isinstance(change.get('status'), str) for change in changes):
+            raise ValueError('changes must be a list of objects with string order_id and status')
+        return [(change['order_id'], change['status']) for change in changes]
+    order_ids, status = data.get('order_ids', []), data.get('status')
+    if not isinstance(order_ids, list) or not all(isinstance(order_id, str) for order_id in order_ids):
+        raise ValueError('order_ids must be a list of strings')
+    if not isinstance(status, str):
+        raise ValueError('status must be a string')
+    return [(order_id, status) for order_id in order_ids]
+
+@app.route('/orders/bulk_status', methods=['POST'])
+def bulk_status():
+    """Change many orders' statuses in one transaction.
+
+    Takes the dashboard form (order_ids checked, one status) or JSON:
+    {"order_ids": [...], "status": "completed"} or
+    {"changes": [{"order_id": ..., "status": ...}, ...]}. JSON requests get
+    a result per order back; the form redirects with a summary.
+    """
+    data = request.get_json(silent=True)
+    if data is not None:
+        try:
+            changes = json_status_changes(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        status = request.form.get('status')
+        changes = [(order_id, status) for order_id in request.form.getlist('order_ids')]
+    if not changes:
+        if data is not None:
+            return jsonify({'error': 'No orders given'}), 400
+        flash('Select at least one order')
+        return back_to_orders()
+
+    results = change_statuses(changes)
+    if data is not None:
+        return jsonify({'updated': sum(1 for result in results if not result['error']), 'results': results})
+    updated = [result for result in results if not result['error']]
+    if updated:
+        flash(f"{len(updated)} orders marked {updated[0]['status']}")
+    for result in results:
+        if result['error']:
+            flash(f"Order {result['order_id']} not updated: {result['error']}")
+    return back_to_orders()
+
+if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file